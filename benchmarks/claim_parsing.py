@@ -0,0 +1,60 @@
+""" Measures the cost of turning 1,000 harem documents into Python objects.
+
+    Usage: python benchmarks/claim_parsing.py [iterations]
+"""
+import os
+import sys
+import time
+import uuid
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import models
+
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+HAREM_SIZE = 1000
+
+
+def fake_claim(index: int) -> dict:
+    return {
+        "_id": uuid.uuid4(),
+        "slug": f"character-{index}",
+        "name": f"Character {index}",
+        "guild_id": 1,
+        "channel_id": 2,
+        "message_id": 3,
+        "user_id": 4,
+        "jump_url": "https://discord.com/channels/1/2/3",
+        "image_url": "https://example.com/image.png",
+        "cached_images_urls": [],
+        "state": random.choice([1, 2, 3]),
+        "index": index,
+        "tier": random.randint(1, 6),
+        "attack": random.randrange(10, 101, 10),
+        "health": random.randrange(50, 251, 10),
+        "speed": random.randrange(10, 101, 10),
+        "trait": 0,
+        "health_points": 100,
+        "timestamp": "2024-01-01 00:00:00+00:00",
+        "timestamp_cooldown": None,
+    }
+
+
+def bench(description: str, parse) -> None:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        for document in documents:
+            parse(document)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / ITERATIONS
+    print(f"{description:<28} {elapsed_ms:8.2f}ms per {HAREM_SIZE:,} claims")
+
+
+documents = [fake_claim(i) for i in range(1, HAREM_SIZE + 1)]
+
+summary_fields = {field.alias or name for name, field in models.ClaimSummary.model_fields.items()}
+projected = [{key: value for key, value in document.items() if key in summary_fields} for document in documents]
+
+bench("Claim (full document)", models.Claim.model_validate)
+documents = projected
+bench("ClaimSummary (projection)", models.ClaimSummary.model_validate)
+bench("ClaimSummary.from_raw", models.ClaimSummary.from_raw)
@@ -0,0 +1,57 @@
+""" Compares `$sample` aggregations against the in-memory catalog pools.
+
+    Usage: python benchmarks/random_sampling.py [iterations]
+"""
+import os
+import sys
+import time
+
+from bson import Binary
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers.catalog import WaifuCatalog
+
+load_dotenv()
+
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+RANKED = {
+    "popularity_rank": {"$ne": None},
+    "like_rank": {"$ne": None},
+    "trash_rank": {"$ne": None}
+}
+CASES = [
+    # (description, extra $match, pool, max_rank, sample size)
+    ("getmywaifu", {}, "ranked", None, 1),
+    ("minigame guess_name", {"popularity_rank": {"$lt": 600}}, "ranked", 600, 1),
+    ("minigame guess_bust", {"bust": {"$ne": None}, "popularity_rank": {"$lt": 600}}, "has_bust", 600, 1),
+    ("minigame smash_or_pass", {"age": {"$gte": 18}, "popularity_rank": {"$lt": 600}}, "adult", 600, 1),
+    ("bot harem", {"popularity_rank": {"$lt": 200}}, "ranked", 200, 3),
+]
+
+print(f"Database URI: {os.getenv('DATABASE_URI')}")
+client = MongoClient(os.getenv("DATABASE_URI"))
+collection = client["waifus"]["core"]
+print(f"Collection name: {collection.database.name}.{collection.name}")
+
+start = time.perf_counter()
+catalog = WaifuCatalog()
+catalog.build(list(collection.find({}, WaifuCatalog.PROJECTION)))
+print(f"Catalog built in {(time.perf_counter() - start) * 1000:.1f}ms")
+print(f"Pool sizes: {', '.join(f'{name}={len(pool):,}' for name, pool in catalog.pools.items())}")
+print()
+
+for description, match, pool, max_rank, size in CASES:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        list(collection.aggregate([{"$match": {**RANKED, **match}}, {"$sample": {"size": size}}]))
+    sample_ms = (time.perf_counter() - start) * 1000 / ITERATIONS
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        entries = catalog.pools[pool].sample(size, max_rank=max_rank)
+        list(collection.find({"_id": {"$in": [Binary.from_uuid(entry.id) for entry in entries]}}))
+    catalog_ms = (time.perf_counter() - start) * 1000 / ITERATIONS
+
+    print(f"{description:<24} $sample: {sample_ms:7.2f}ms  catalog: {catalog_ms:7.2f}ms  ({sample_ms / catalog_ms:.1f}x)")
@@ -1,10 +1,11 @@
 import os
-import shutil
+import asyncio
+import datetime
 import tempfile
 import platform
 from collections import namedtuple
-from typing import Dict
 
+import aiohttp
 import aiohttp_client_cache
 import disnake
 from disnake import Activity, ActivityType
@@ -12,14 +13,17 @@ from disnake.ext import commands
 from loguru import logger
 from beanie import init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
-from PIL import Image
 
 import models
 import utils
-from helpers import Mongo, API
+from helpers import Mongo, API, ImageCache, waifu_catalog, migrate_vote_index
+from utils.images import ImagePool, composite_versus_image, normalize_character_image
 
 VERSION = "0.10.0"
 
+# Discord attachment links are signed and expire after about a day
+VERSUS_IMAGE_URL_MAX_AGE = datetime.timedelta(hours=20)
+
 Config = namedtuple(
     "Config",
     [
@@ -29,6 +33,9 @@ Config = namedtuple(
         "DISCORD_BOT_TOKEN",
         "DATABASE_URI",
         "MAL_CLIENT_ID",
+        "IMAGE_WORKERS",
+        "IMAGE_MAX_BYTES",
+        "AUTO_SEASON_END",
     ],
 )
 
@@ -45,6 +52,7 @@ class NyahBot(commands.InteractionBot):
     async def setup_hook(self):
         # Initialize temporary directory
         self.create_temp_dir()
+        self.clear_temp_dir()
         logger.debug(f"Initialized temp directory {self.temp_dir}")
 
         # Load cogs
@@ -61,29 +69,48 @@ class NyahBot(commands.InteractionBot):
         self.client = AsyncIOMotorClient(self.config.DATABASE_URI, io_loop=self.loop)
         if self.config.TEST_MODE:
             await init_beanie(self.client["waifus"], document_models=[models.Waifu])
-            await init_beanie(self.client["_nyah"], document_models=[models.NyahConfig, models.NyahGuild, models.NyahPlayer])
+            await init_beanie(self.client["_nyah"], document_models=[models.NyahConfig, models.NyahGuild, models.NyahPlayer, models.Season])
             await init_beanie(self.client["_waifus"], document_models=[models.Claim])
-            await init_beanie(self.client["_wars"], document_models=[models.Event, models.Match, models.Battle, models.Round, models.Vote])
+            await migrate_vote_index(self.client["_wars"])
+            await init_beanie(self.client["_wars"], document_models=[models.Event, models.Match, models.Battle, models.Round, models.Vote, models.VersusImage])
             logger.warning("Running in test mode. Connected to test database.")
         else:
-            await init_beanie(self.client["nyah"], document_models=[models.NyahConfig, models.NyahGuild, models.NyahPlayer])
+            await init_beanie(self.client["nyah"], document_models=[models.NyahConfig, models.NyahGuild, models.NyahPlayer, models.Season])
             await init_beanie(self.client["waifus"], document_models=[models.Waifu, models.Claim])
-            await init_beanie(self.client["wars"], document_models=[models.Event, models.Match, models.Battle, models.Round, models.Vote])
+            await migrate_vote_index(self.client["wars"])
+            await init_beanie(self.client["wars"], document_models=[models.Event, models.Match, models.Battle, models.Round, models.Vote, models.VersusImage])
             logger.success("Connected to database.")
 
         # Create the global bot settings entry if it doesn't exist
         await self.create_settings_entry()
+
+        # Warm the config cache so commands never read the config collection
+        await models.nyah_config_cache.load()
+
+        # Build the in-memory character catalog used for random draws
+        await waifu_catalog.refresh()
         
         # Initialize aiohttp session
         self.session = aiohttp_client_cache.CachedSession(
             cache=aiohttp_client_cache.CacheBackend(expire_after=600),
             loop=self.loop
         )
+        self.download_session = aiohttp.ClientSession(loop=self.loop)
+
+        # Start the worker processes used for image compositing
+        self.image_pool = ImagePool(self.config.IMAGE_WORKERS)
 
         # Set up interfaces
-        self.api = API(self.session, self.temp_dir)
+        self.image_cache = ImageCache(os.path.join(self.temp_dir, "images"))
+        self.api = API(self.session, self.image_cache, self.download_session, max_image_bytes=self.config.IMAGE_MAX_BYTES)
         self.mongo = Mongo()
 
+        # Warn about any hot query that isn't covered by an index
+        await self.mongo.check_query_plans()
+
+        # Build the in-memory ladder used for duel matchmaking
+        await self.mongo.load_duel_ladder()
+
     async def on_ready(self):
         # fmt: off
         logger.info("------")
@@ -97,6 +124,8 @@ class NyahBot(commands.InteractionBot):
 
     async def close(self):
         await self.session.close()
+        await self.download_session.close()
+        self.image_pool.shutdown()
         await super().close()
 
     def create_temp_dir(self):
@@ -105,13 +134,15 @@ class NyahBot(commands.InteractionBot):
             os.mkdir(self.temp_dir)
 
     def clear_temp_dir(self):
+        """ Delete the loose files older versions downloaded into the temp directory.
+
+            Images now live in the `ImageCache` subdirectory, which is left alone.
+        """
         for file in os.listdir(self.temp_dir):
             file_path = os.path.join(self.temp_dir, file)
             try:
                 if os.path.isfile(file_path) or os.path.islink(file_path):
                     os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
             except Exception as e:
                 logger.error(f"Error deleting {file}: {e}")
 
@@ -129,9 +160,11 @@ class NyahBot(commands.InteractionBot):
         return self.get_cog("Waifus")
 
     async def before_invoke(self, inter: disnake.ApplicationCommandInteraction):
-        nyah_player = await models.NyahPlayer.find_one(
-            models.NyahPlayer.user_id == inter.author.id
-        )
+        # every player load/save made by this command goes through the unit of work
+        unit_of_work = models.PlayerUnitOfWork()
+        models.current_unit_of_work.set(unit_of_work)
+
+        nyah_player = await unit_of_work.get(inter.author.id)
         
         channel_id = nyah_player.last_command_channel_id
         message_id = nyah_player.last_command_message_id
@@ -155,21 +188,23 @@ class NyahBot(commands.InteractionBot):
             return await message.edit(view=None)
 
     async def after_invoke(self, inter: disnake.ApplicationCommandInteraction):
-        nyah_player = await models.NyahPlayer.find_one(
-            models.NyahPlayer.user_id == inter.author.id
-        )
-        
-        message = await inter.original_response()
-        if not message.components or message.flags.ephemeral:
-            nyah_player.last_command_name = None
-            nyah_player.last_command_channel_id = None
-            nyah_player.last_command_message_id = None
-        else:
-            nyah_player.last_command_name = inter.data.name
-            nyah_player.last_command_channel_id = inter.channel.id
-            nyah_player.last_command_message_id = message.id
-        
-        await nyah_player.save()
+        unit_of_work = models.current_unit_of_work.get()
+        try:
+            nyah_player = await unit_of_work.get(inter.author.id)
+            
+            message = await inter.original_response()
+            if not message.components or message.flags.ephemeral:
+                nyah_player.last_command_name = None
+                nyah_player.last_command_channel_id = None
+                nyah_player.last_command_message_id = None
+            else:
+                nyah_player.last_command_name = inter.data.name
+                nyah_player.last_command_channel_id = inter.channel.id
+                nyah_player.last_command_message_id = message.id
+        finally:
+            await unit_of_work.commit()
+            models.current_unit_of_work.set(None)
+            logger.debug(f"/{inter.data.name} | {unit_of_work.reads} player reads, {unit_of_work.writes} player writes")
 
     async def upload_image_to_discord(self, path_file: os.PathLike | str | disnake.File) -> disnake.Attachment:
         """Upload the image to discord (free image hosting)"""
@@ -183,11 +218,39 @@ class NyahBot(commands.InteractionBot):
         logger.info(f"Uploaded image {image_host_msg.attachments[0].url}")
         return image_host_msg.attachments[0]
 
+    async def fetch_versus_portrait(self, image_url: str) -> str | None:
+        """ Get the normalized copy of a character image used by the versus compositor.
+
+            The copy is made once from the downloaded original and kept in the
+            image cache, so later battles skip decoding the full-size image.
+
+            Returns
+            -------
+            `str`
+                The path of the normalized image, or `None` if it couldn't be downloaded.
+        """
+        portrait_name = f"{image_url}#portrait"
+        portrait_path = self.image_cache.lookup(portrait_name)
+        if portrait_path:
+            return portrait_path
+
+        image_path = await self.api.download_image(image_url)
+        if not image_path:
+            return None
+        try:
+            await self.image_pool.run(normalize_character_image, image_path, self.image_cache.path(portrait_name))
+            return self.image_cache.record(portrait_name)
+        except Exception as err:
+            logger.error(f"Normalizing image {image_url} failed! {err}")
+            return None
+
     async def create_waifu_vs_img(self, red_waifu: models.Claim, blue_waifu: models.Claim) -> str:
         """ Create a waifu war round versus thumbnail image.
             Red is on the left and blue is on the right.
 
-            Get ready to see the worst code ever written.
+            The downloads are awaited here and the compositing runs in the
+            image process pool on the normalized copies of both images, so
+            the event loop only waits on the result.
 
             Parameters
             ----------
@@ -201,136 +264,47 @@ class NyahBot(commands.InteractionBot):
             `str`
                 The URL of the versus image.
         """
-        UPPER_LEFT_INX = 0
-        LOWER_RIGHT_INX = 1
-        X_COORD_INX = 0
-        Y_COORD_INX = 1
-
-        def scale_image(img: Image.Image, scale_percent: float) -> Image.Image:
-            """ Scales an image to `scale_percent`. """
-            dim = (int(img.width * scale_percent), int(img.height * scale_percent))
-            return img.resize(dim, resample=Image.Resampling.BICUBIC)
-
-        def get_bounding_box_coords(img: Image.Image) -> list:
-            """ Returns the coordinates of two boxes.  """
-            return [
-                # (x0, y0), (x1, y1)
-                [(int(img.width*0.10), int(img.height*0.10)), (int(img.width*0.40), int(img.height*0.90))], # left side
-                # (x2, y2), (x3, y3)
-                [(int(img.width*0.60), int(img.height*0.10)), (int(img.width*0.90), int(img.height*0.90))]  # right side
-            ]
-
-        def center_place(img: Image.Image, bb_coords: list) -> tuple:
-            """ Calculate upper-left coordinate to place an image in center of bounding box. """
-            bb_width = bb_coords[LOWER_RIGHT_INX][X_COORD_INX] - bb_coords[UPPER_LEFT_INX][X_COORD_INX]
-            bb_height = bb_coords[LOWER_RIGHT_INX][Y_COORD_INX] - bb_coords[UPPER_LEFT_INX][Y_COORD_INX]
-            center_x = bb_coords[UPPER_LEFT_INX][X_COORD_INX] + bb_width//2
-            center_y = bb_coords[UPPER_LEFT_INX][Y_COORD_INX] + bb_height//2
-
-            return (center_x - img.width//2, center_y - img.height//2)
-
-        # create the output path
-        output_path = os.path.join(self.temp_dir, f"{red_waifu.id}.vs.{blue_waifu.id}.png")
+        # reuse the hosted image if this pairing was uploaded recently
+        versus_key = ImageCache.key(f"{red_waifu.id}:{blue_waifu.id}:{red_waifu.image_url}:{blue_waifu.image_url}")
+        hosted_url = await self.mongo.fetch_versus_image_url(versus_key, VERSUS_IMAGE_URL_MAX_AGE)
+        if hosted_url:
+            return hosted_url
 
         # check if the image already exists
-        if os.path.exists(output_path):
-            attachment = await self.upload_image_to_discord(output_path)
+        image_name = f"{red_waifu.id}.vs.{blue_waifu.id}.jpg"
+        cached_path = self.image_cache.lookup(image_name)
+        if cached_path:
+            attachment = await self.upload_image_to_discord(disnake.File(cached_path, filename=image_name))
+            await self.mongo.upsert_versus_image(versus_key, attachment.url)
             return attachment.url
+        output_path = self.image_cache.path(image_name)
 
-        # load background
-        bg_img = Image.open("assets/vs.jpg") # "https://external-content.duckduckgo.com/iu/?u=https%3A%2F%2Fstatic.vecteezy.com%2Fsystem%2Fresources%2Fpreviews%2F000%2F544%2F945%2Foriginal%2Fcomic-fighting-cartoon-background-blue-vs-red-vector-illustration-design.jpg&f=1&nofb=1&ipt=d7b1d0d9bb512e200148263e80ad893ee95f011cf44cfc20417a2da90f94642a&ipo=images"
-        if (bg_img.mode != "RGBA"):
-            bg_img = bg_img.convert("RGBA")
-
-        # get initial bounding box coords [upper-left, lower-right]
-        bb = get_bounding_box_coords(bg_img)
-
-        # load 2 foreground images
-        waifus: Dict[str, Dict[str, Image.Image | models.Claim | int]] = {
-            "red": {
-                "object": red_waifu,
-                "image": None,
-                "long_inx": None
-            },
-            "blue": {
-                "object": blue_waifu,
-                "image": None,
-                "long_inx": None
-            },
-        }
-        for waifu_color, waifu_value in waifus.items():
-            # get claim
-            claim = waifu_value["object"]
-
-            # download image
-            image_path = await self.api.download_image(claim.image_url)
-
-            # load fg image
-            if image_path:
-                load_img = Image.open(image_path)
-            else:
-                load_img = Image.open("assets/waifu_404.png")
-            if (load_img.mode != "RGBA"):
-                load_img = load_img.convert("RGBA")
-            
-            # save the image
-            waifus[waifu_color]["image"] = load_img
+        # download and normalize both images
+        red_image_path, blue_image_path = await asyncio.gather(
+            self.fetch_versus_portrait(red_waifu.image_url),
+            self.fetch_versus_portrait(blue_waifu.image_url),
+        )
 
-            # determine longer side of each fg image
-            if waifus[waifu_color]["image"].height > waifus[waifu_color]["image"].width:
-                waifus[waifu_color]["long_inx"] = 1 # 1=height in .size
-            else:
-                waifus[waifu_color]["long_inx"] = 0 # 0=width in .size
-        
-        # determine the smaller image of the two using total pixels
-        if (waifus["red"]["image"].width * waifus["red"]["image"].height) < (waifus["blue"]["image"].width * waifus["blue"]["image"].height):
-            small_img_key = "red"
-            large_img_key = "blue"
-        else:
-            small_img_key = "blue"
-            large_img_key = "red"
-        
-        # get length of bb side-of-interest
-        bb_long = bb[0][LOWER_RIGHT_INX][waifus[small_img_key]["long_inx"]] - bb[0][UPPER_LEFT_INX][waifus[small_img_key]["long_inx"]]
-        if waifus[small_img_key]["image"].size[waifus[small_img_key]["long_inx"]] < bb_long: # if the smaller fg is smaller than the bb
-            # scale the bg image
-            scale_percent = waifus[small_img_key]["image"].size[waifus[small_img_key]["long_inx"]] / bb_long
-            bg_img = scale_image(bg_img, scale_percent)
-
-            # scale the bb to the new bg size
-            bb = get_bounding_box_coords(bg_img)
-
-            # scale the larger fg to the new bb size
-            bb_long = bb[0][LOWER_RIGHT_INX][waifus[large_img_key]["long_inx"]] - bb[0][UPPER_LEFT_INX][waifus[large_img_key]["long_inx"]]
-            scale_percent = bb_long / waifus[large_img_key]["image"].size[waifus[large_img_key]["long_inx"]]
-            waifus[large_img_key]["image"] = scale_image(waifus[large_img_key]["image"], scale_percent)
-        else: # if the bb is smaller than the smaller fg
-            # scale both fg images to the bb
-            for key, waifu_value in waifus.items():
-                fg_img = waifu_value["image"]
-                long_inx = waifu_value["long_inx"]
-                bb_long = bb[0][LOWER_RIGHT_INX][long_inx] - bb[0][UPPER_LEFT_INX][long_inx]
-                scale_percent = bb_long / fg_img.size[long_inx]
-                waifus[key]["image"] = scale_image(fg_img, scale_percent)
-
-        # final scaling and overlaying
-        for bb_inx, (_, waifu_value) in enumerate(waifus.items()):
-            fg_img = waifu_value["image"]
-            # in case a fg image's width is too wide for the bb, scale once more
-            bb_width = bb[bb_inx][LOWER_RIGHT_INX][X_COORD_INX] - bb[bb_inx][UPPER_LEFT_INX][X_COORD_INX]
-            if fg_img.width > bb_width:
-                scale_percent = bb_width / fg_img.width
-                fg_img = scale_image(fg_img, scale_percent)
-
-            # overlay fg images onto bg
-            bg_img.paste(fg_img, box=center_place(fg_img, bb[bb_inx]), mask=fg_img)
-
-        # save the image
-        bg_img.save(output_path)
+        # a missing image is drawn as a placeholder, which must not be cached so the next battle retries it
+        is_complete = red_image_path is not None and blue_image_path is not None
+        if not is_complete:
+            output_path = self.image_cache.temp_path(image_name)
+
+        # composite the image in a worker process
+        logger.debug(f"Queued versus image {output_path} ({self.image_pool.pending} image jobs pending)")
+        await self.image_pool.run(composite_versus_image, red_image_path, blue_image_path, output_path)
         logger.info(f"Created image {output_path}")
 
         # upload the image
-        attachment = await self.upload_image_to_discord(output_path)
+        if not is_complete:
+            try:
+                attachment = await self.upload_image_to_discord(disnake.File(output_path, filename=image_name))
+            finally:
+                os.remove(output_path)
+            return attachment.url
+        self.image_cache.record(image_name)
+        attachment = await self.upload_image_to_discord(disnake.File(output_path, filename=image_name))
+        await self.mongo.upsert_versus_image(versus_key, attachment.url)
 
         # return the URL of the image
         return attachment.url
@@ -20,53 +20,27 @@ class Multiplayer(commands.Cog):
         self.bot = bot
 
     async def find_duel_opponent(self, guild: disnake.Guild, user: disnake.User | disnake.Member) -> Tuple[disnake.User, int]:
-        nyah_players = await self.bot.mongo.fetch_all_nyah_players()
         nyah_player = await self.bot.mongo.fetch_nyah_player(user)
-
-        neighbors = []
         user_rating = nyah_player.score
-        total_players = len(nyah_players)
-
-        # Determine the number of neighbors above and below the user based on total players
-        num_neighbors = min(total_players - 1, 4)  # Max 4 neighbors (2 above, 2 below)
 
-        for i, neighbor in enumerate(nyah_players):
-            if await self.bot.mongo.fetch_harem_married_count(neighbor) != 3:
-                continue
-            if neighbor.user_id != nyah_player.user_id:
-                if i < num_neighbors or (total_players - i) <= num_neighbors:
-                    neighbors.append(neighbor)
+        # Up to 2 eligible players above and 2 below the user's rating
+        neighbors = await self.bot.mongo.fetch_duel_neighbors(nyah_player, 2)
 
         # No suitable neighbors
         if not neighbors:
             bot_rating = max(user_rating + random.randint(-int(user_rating * 0.03), int(user_rating * 0.10)), 0)
             return self.bot.user, bot_rating
 
-        # Calculate similarity scores for each neighbor
-        similarity_scores = []
-        for neighbor in neighbors:
-            score_diff = abs(user_rating - neighbor.score) // 10
-            similarity_score = 1 / (1 + score_diff)
-            similarity_scores.append(similarity_score)
-        
-        # Check if there's a similarity score greater than 20%
-        # if max(similarity_scores) < 0.20:
-        #     bot_rating = max(user_rating + random.randint(-int(user_rating * 0.03), int(user_rating * 0.10)), 0)
-        #     return self.bot.user, bot_rating
-
-        # Select the opponent with the highest similarity score
-        # best_opponent = neighbors[similarity_scores.index(max(similarity_scores))]
-            
         # Select a random opponent
-        best_opponent = random.choice(neighbors)
-        opponent = await guild.fetch_member(best_opponent.user_id)
-        return opponent, best_opponent.score
+        opponent_rating, opponent_id = random.choice(neighbors)
+        opponent = await guild.fetch_member(opponent_id)
+        return opponent, opponent_rating
 
     async def generate_bot_harem(self, player_harem: models.Harem) -> models.Harem:
         bot_harem = []
         total_characters = await self.bot.mongo.fetch_waifu_count()
-        for _ in player_harem:
-            waifu = await self.bot.mongo.fetch_random_waifu([{"$match": {"popularity_rank": {"$lt": 200}}}])
+        waifus = await self.bot.mongo.fetch_random_waifus(len(player_harem), max_rank=200)
+        for waifu in waifus:
 
             claim = models.Claim(
                 slug=waifu.slug,
@@ -185,7 +159,7 @@ class Multiplayer(commands.Cog):
 
         # Set timestamp in db
         nyah_player.timestamp_last_duel = disnake.utils.utcnow()
-        await self.bot.mongo.update_nyah_player(nyah_player)
+        await self.bot.mongo.update_nyah_player(nyah_player, flush=True) # cooldown must be visible while the view is open
 
         # Create the message
         duel_view = DuelView(
@@ -202,12 +176,12 @@ class Multiplayer(commands.Cog):
 
         # Calculate and update user's MMR
         rating_change = self.calculate_new_rating(nyah_player.score, opponent_rating, duel_view.player_won)
-        await nyah_player.add_user_mmr(rating_change)
+        await self.bot.mongo.add_user_mmr(nyah_player, rating_change)
 
         # Opponents lose a slight amount of MMR to discourage inactivity
         if opponent.id != self.bot.user.id and duel_view.player_won:
             opps_nyah_player = await self.bot.mongo.fetch_nyah_player(opponent)
-            await opps_nyah_player.add_user_mmr(-int(rating_change * 0.35))
+            await self.bot.mongo.add_user_mmr(opps_nyah_player, -int(rating_change * 0.35))
 
         # If user won
         if duel_view.player_won:
@@ -216,7 +190,7 @@ class Multiplayer(commands.Cog):
                 description=f"You gained `{rating_change}` MMR and earned `{Experience.DUEL_WIN.value}` XP",
                 color=disnake.Color.green()
             )
-            await nyah_player.add_user_xp(Experience.DUEL_WIN.value, inter.author, inter.channel)
+            await self.bot.mongo.add_user_xp(nyah_player, Experience.DUEL_WIN.value, inter.author, inter.channel)
 
         # If user lost
         else:
@@ -378,23 +352,19 @@ class Multiplayer(commands.Cog):
         inter: disnake.ApplicationCommandInteraction,
         user_input: str
     ) -> List[str]:
-        harem_married_size = await self.bot.mongo.fetch_harem_married_count(inter.author)
-        if harem_married_size == 0:
+        harem = await self.bot.mongo.fetch_harem_summaries(inter.author, married=True, trusted=True)
+        if len(harem) == 0:
             return [f"You have no waifus to duel!"]
         
-        if user_input.isdigit() and int(user_input) <= harem_married_size:
-            index = int(user_input)
-            claim = await self.bot.mongo.fetch_claim_by_index(inter.author, index)
-            waifu = await self.bot.mongo.fetch_waifu(claim.slug)
-            formatted_name = f"{claim.index}. {waifu.name}"
+        selected = [claim for claim in harem if user_input.isdigit() and claim.index == int(user_input)]
+        if selected:
+            claim = selected[0]
+            formatted_name = f"{claim.index}. {claim.name}"
             waifu_names = [formatted_name]
         else:
-            harem = await self.bot.mongo.fetch_harem_married(inter.author)
-            
             waifu_names = []
             for claim in harem:
-                waifu = await self.bot.mongo.fetch_waifu(claim.slug)
-                formatted_name = f"{claim.index}. {waifu.name} ({claim.skill_str_short})"
+                formatted_name = f"{claim.index}. {claim.name} ({claim.skill_str_short})"
                 waifu_names.append(formatted_name)
         
         return deque(waifu_names, maxlen=25)
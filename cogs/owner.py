@@ -1,3 +1,4 @@
+import time
 import codecs
 import datetime
 
@@ -5,9 +6,11 @@ import disnake
 from disnake.ext import commands
 from loguru import logger
 
+import models
+import utils
 from bot import NyahBot
 from helpers import SuccessEmbed, ErrorEmbed
-from utils.constants import Cooldowns, WaifuState
+from utils.constants import Cooldowns
 
 
 class Owner(commands.Cog):
@@ -231,23 +234,51 @@ class Owner(commands.Cog):
         """ End the current season. """
         await inter.response.defer(ephemeral=True)
 
-        await self.bot.mongo.update_all_nyah_players("score", 100)
-        await self.bot.mongo.update_all_nyah_players("level", 0)
-        await self.bot.mongo.update_all_nyah_players("xp", 0)
-        await self.bot.mongo.update_all_nyah_players("money", 0)
-        await self.bot.mongo.update_all_nyah_players("wishlist", [])
-        await self.bot.mongo.update_all_nyah_players("timestamp_last_claim", None)
-        await self.bot.mongo.update_all_nyah_players("timestamp_last_duel", None)
-        await self.bot.mongo.update_all_nyah_players("timestamp_last_minigame", None)
+        start = time.perf_counter()
+        season = await self.bot.mongo.reset_season()
+        elapsed = time.perf_counter() - start
 
-        await self.bot.mongo.update_all_claims("state", WaifuState.INACTIVE)
-        await self.bot.mongo.update_all_claims("index", None)
+        await inter.edit_original_response(
+            embed=SuccessEmbed(f"Season ended in `{elapsed:.2f}s`!\n"
+                               f"Players reset: `{season.players_reset:,}`\n"
+                               f"Claims reset: `{season.claims_reset:,}`\n"
+                               f"Standings archived: `{len(season.standings):,}`")
+        )
 
-        nyah_config = await self.bot.mongo.fetch_nyah_config()
-        nyah_config.timestamp_last_season_end = disnake.utils.utcnow()
-        await self.bot.mongo.update_nyah_config(nyah_config)
+    @owner.sub_command()
+    async def stats(self, inter: disnake.ApplicationCommandInteraction):
+        """ View internal cache statistics. """
+        config_cache = models.nyah_config_cache
+        image_pool = self.bot.image_pool
+        image_cache = self.bot.image_cache
+        api = self.bot.api
+        embed = disnake.Embed(
+            title="Stats",
+            color=disnake.Color.dark_teal()
+        ).add_field(
+            name="Config Cache",
+            value=f"Hits: `{config_cache.hits:,}`\n"
+                  f"Misses: `{config_cache.misses:,}`",
+        ).add_field(
+            name="Image Pool",
+            value=f"Workers: `{image_pool.max_workers}`\n"
+                  f"Pending: `{image_pool.pending:,}`\n"
+                  f"Completed: `{image_pool.completed:,}`",
+        ).add_field(
+            name="Image Cache",
+            value=f"Hits: `{image_cache.hits:,}`\n"
+                  f"Misses: `{image_cache.misses:,}`\n"
+                  f"Hit Rate: `{image_cache.hit_rate:.1%}`\n"
+                  f"Size: `{utils.humanbytes(image_cache.total_bytes)}` / `{utils.humanbytes(image_cache.max_bytes)}`\n"
+                  f"Evictions: `{image_cache.evictions:,}`",
+        ).add_field(
+            name="Image Downloads",
+            value=f"Started: `{api.downloads_started:,}`\n"
+                  f"Coalesced: `{api.downloads_coalesced:,}`\n"
+                  f"In Flight: `{len(api.downloads_in_flight):,}`",
+        )
 
-        await inter.edit_original_response(embed=SuccessEmbed("Season ended!"))
+        return await inter.response.send_message(embed=embed, ephemeral=True)
 
 
 def setup(bot: commands.Bot):
@@ -3,6 +3,7 @@ from typing import List
 
 import disnake
 from disnake.ext import commands
+from loguru import logger
 
 import utils
 from bot import NyahBot
@@ -61,15 +62,24 @@ class Shop(commands.Cog):
         shop_item = get_shop_item(item_type)
         total_price = shop_item.price * amount
 
-        if total_price > nyah_player.money:
+        if not await self.bot.mongo.spend_user_money(nyah_player, total_price):
             return await inter.edit_original_response(
                 embed=ErrorEmbed(
                     description=f"You don't have enough money to buy `{amount}` {shop_item.name}(s)!"
                 )
             )
 
-        await nyah_player.add_user_money(-total_price)
-        await nyah_player.add_inventory_item(shop_item.type, amount)
+        try:
+            await self.bot.mongo.add_inventory_item(nyah_player, shop_item.type, amount)
+        except ValueError as e:
+            # the money was already taken, so give it back
+            await self.bot.mongo.add_user_money(nyah_player, total_price)
+            logger.error(f"Refunded {inter.author}[{inter.author.id}] after a failed purchase: {e}")
+            return await inter.edit_original_response(
+                embed=ErrorEmbed(
+                    description=f"Couldn't add `{amount}` {shop_item.name}(s) to your inventory, your `{total_price:,}` {Emojis.COINS} were refunded!"
+                )
+            )
 
         return await inter.edit_original_response(
             embed=SuccessEmbed(
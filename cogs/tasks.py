@@ -1,7 +1,3 @@
-import os
-import datetime
-import tempfile
-
 from disnake.ext import commands, tasks
 from loguru import logger
 
@@ -10,29 +6,21 @@ from bot import NyahBot
 class Tasks(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot: NyahBot = bot
-        self.clean_temp_dir.start()
+        self.evict_image_cache.start()
 
-    @tasks.loop(hours=1.0)
-    async def clean_temp_dir(self):
-        """Clears all files from the bot's temporary directory."""
+    @tasks.loop(minutes=10.0)
+    async def evict_image_cache(self):
+        """Trims the image cache back down to its byte budget."""
         logger.debug(
-            f"Cleaning temp directory... [loop #{self.clean_temp_dir.current_loop}]"
+            f"Evicting image cache... [loop #{self.evict_image_cache.current_loop}]"
         )
 
-        # The first iteration of this task is executed when
-        # the bot starts. This checks if we are in that
-        # initial loop
-        if self.clean_temp_dir.current_loop == 0:
-            # If there is anything that needs to
-            # happen on the first iteration of a
-            # task, then put it here.
-            pass
-
-        # Delete all files from the temporary directory
-        self.bot.clear_temp_dir()
-        logger.info("Finished clearing temp directory.")
+        image_cache = self.bot.image_cache
+        evicted = image_cache.evict()
+        logger.info(f"Evicted {evicted:,} cached images, {len(image_cache):,} images "
+                    f"({image_cache.total_bytes:,} bytes) remain. Hit rate: {image_cache.hit_rate:.1%}")
 
-    @clean_temp_dir.before_loop
+    @evict_image_cache.before_loop
     async def wait_before_tasks(self):
         await self.bot.wait_until_ready()
 
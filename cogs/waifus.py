@@ -11,10 +11,10 @@ from loguru import logger
 
 import utils
 from bot import NyahBot
-from models import Claim, Event
+from models import Event, Claim, Round
 from helpers import ErrorEmbed, WaifuCoreEmbed, WaifuClaimEmbed, WaifuHaremEmbed, WaifuBaseEmbed
 from utils.constants import Emojis, WaifuState, Cooldowns, Experience, Prices, Tiers, Fusions, TIER_EMOJI_MAP, TIER_TITLE_MAP, TIER_COST_MAP,FUSION_TIER_MAP
-from utils.bracket import Bracket
+from utils.bracket import Bracket, BYE
 from utils.items import ItemFactory
 from views import *
 
@@ -23,8 +23,13 @@ class Waifus(commands.Cog):
         self.bot: NyahBot = bot
         self.last_date = datetime.date.today()
         self.waifu_housekeeping.start()
+        self.resume_waifu_wars.start()
         # self.waifu_war_creation.start()
         self.waifu_war_tasks = {}
+        self.brackets: typing.Dict[int, Bracket] = {}
+        self.prerendered_claims: typing.Dict[int, typing.Dict[int, Claim]] = {} # guild id -> user id -> claim
+        self.prerendered_images: typing.Dict[int, typing.Dict[tuple, asyncio.Task]] = {} # guild id -> claim id pair -> task rendering the vs image
+        self.prerender_tasks: typing.Dict[int, typing.Set[asyncio.Task]] = {} # guild id -> running picks and portrait downloads
 
     ##*************************************************##
     ##********           ABSTRACTIONS           *******##
@@ -232,65 +237,50 @@ class Waifus(commands.Cog):
         
         return event_user_ids
 
-    async def end_waifu_war_season(self, guild: disnake.Guild) -> None:
-        """ Resets all user's waifus, scores, and coins in a given guild
-            if the guild's reset interval is met.
+    async def end_waifu_war_season(self) -> None:
+        """ Resets all user's waifus, scores, and coins if the season
+            interval is met, then announces it in every guild.
 
-            Parameters
-            ----------
-            guild: `disnake.Guild`
-                The guild to end the season in.
+            Only runs with the `AUTO_SEASON_END` setting turned on, otherwise
+            seasons are ended by hand with `/owner end_season`.
         """
+        if not self.bot.config.AUTO_SEASON_END:
+            return
+
         nyah_config = await self.bot.mongo.fetch_nyah_config()
         
         season_end_datetime = nyah_config.timestamp_last_season_end + datetime.timedelta(days=nyah_config.interval_season_days)
         if disnake.utils.utcnow() < season_end_datetime:
             return
         
-        return logger.debug(f"{guild.name}'s WAIFU WAR SEASON SHOULD END")
-        
-        nyah_guild = await self.bot.mongo.fetch_nyah_guild(guild)
-        waifu_war_channel = await guild.fetch_channel(nyah_config.waifu_war_channel_id)
-        ww_role = await self.get_waifu_war_role(guild)
-        msg_embed = disnake.Embed(
-            title="⚔️ WAIFU WARS SEASON END ⚔️",
-            color=disnake.Color.random(),
-            description=f"{guild.name}'s Waifu War season is over!\n"
-                        f"__All scores will be reset to 0!__"
-                        f"__All harems will be fully reset!__",
-        )
-        
-        await waifu_war_channel.send(
-            content=ww_role.mention,
-            embed=msg_embed,
-        )
+        season = await self.bot.mongo.reset_season()
 
-        r.db("nyah") \
-            .table("players") \
-            .get_all(str(guild.id), index="guild_id") \
-            .update({
-                "score": 0
-            }) \
-            .run(conn)
-        r.db("nyah") \
-            .table("guilds") \
-            .get(str(guild.id)) \
-            .update({
-                "timestamp_last_season_end": datetime.datetime.now(datetime.timezone.utc)
-            }) \
-            .run(conn)
-        r.db("waifus") \
-            .table("claims") \
-            .get_all(str(guild.id), index="guild_id") \
-            .update({
-                "state": None,
-                "index": None,
-            }) \
-            .run(conn)
-        # TODO update season results in db
+        for guild in self.bot.guilds:
+            nyah_guild = await self.bot.mongo.fetch_nyah_guild(guild)
+            if not nyah_guild:
+                continue
+            waifu_war_channel = await guild.fetch_channel(nyah_guild.waifu_war_channel_id)
+            ww_role = await self.get_waifu_war_role(guild)
+            msg_embed = disnake.Embed(
+                title="⚔️ WAIFU WARS SEASON END ⚔️",
+                color=disnake.Color.random(),
+                description="The Waifu War season is over!\n"
+                            "__All scores will be reset!__\n"
+                            "__All harems will be fully reset!__",
+            )
+            if season.standings:
+                msg_embed.add_field(
+                    name="Final Standings",
+                    value="\n".join(f"`{i}.` **{standing.name}** - `{standing.score}`" for i, standing in enumerate(season.standings[:3], 1)),
+                )
+            
+            await waifu_war_channel.send(
+                content=ww_role.mention if ww_role else None,
+                embed=msg_embed,
+            )
 
-        logger.info(f"{guild.name}[{guild.id}] | "
-                             f"Waifu War season has been reset!")
+            logger.info(f"{guild.name}[{guild.id}] | "
+                                 f"Waifu War season has been reset!")
 
     async def delete_waifu_war_threads(self, guild: disnake.Guild) -> None:
         """ Deletes any threads for waifu wars that are 24 hours old.
@@ -374,6 +364,116 @@ class Waifus(commands.Cog):
                 # Remove user from role if
                 await member.remove_roles(ww_role)
 
+    async def prerender_next_battles(self, guild: disnake.Guild, bracket: Bracket, current_round: Round) -> None:
+        """ Speculatively pick the claims for the next battles and render their images.
+
+            Runs in the background while the votes for `current_round` are
+            coming in, see `start_prerender`. Every undecided
+            match, and every next round match with both users already known (byes
+            and finished matches), gets a random married claim per user and a VS
+            image rendered in the background. Users still waiting on an opponent
+            only get their image downloaded and normalized. Next round picks are
+            kept until they are used, and every pick is checked again when the
+            battle is made, so a claim that lost its battle is re-rolled.
+
+            Parameters
+            ----------
+            guild: `disnake.Guild`
+                The guild the war is in.
+            bracket: `Bracket`
+                The guild's bracket.
+            current_round: `Round`
+                The round that is being voted on.
+        """
+        pairings = []
+        singles = []
+        for current_match in bracket.get_round_matches(current_round):
+            if not current_match.winner_id and not bracket.match_has_bye(current_match):
+                pairings.append((current_match.user_red_id, current_match.user_blue_id))
+        next_round = bracket.get_round(current_round.number + 1)
+        if next_round:
+            for next_match in bracket.get_round_matches(next_round):
+                known_ids = [user_id for user_id in (next_match.user_red_id, next_match.user_blue_id) if user_id not in (None, BYE)]
+                if len(known_ids) == 2:
+                    pairings.append(tuple(known_ids))
+                else:
+                    singles.extend(known_ids)
+
+        try:
+            claims = self.prerendered_claims.setdefault(guild.id, {})
+            for user_id in [user_id for pairing in pairings for user_id in pairing] + singles:
+                if user_id in claims:
+                    continue
+                user = self.bot.get_user(int(user_id)) or await self.bot.fetch_user(int(user_id))
+                if await self.bot.mongo.fetch_harem_married_count(user) > 0:
+                    claims[user_id] = await self.bot.mongo.fetch_random_harem_married(user)
+
+            images = self.prerendered_images.setdefault(guild.id, {})
+            for red_id, blue_id in pairings:
+                if red_id in claims and blue_id in claims:
+                    red_claim, blue_claim = claims[red_id], claims[blue_id]
+                    if (red_claim.id, blue_claim.id) not in images:
+                        task = asyncio.create_task(self.bot.create_waifu_vs_img(red_claim, blue_claim))
+                        task.add_done_callback(self.log_prerender_failure)
+                        images[(red_claim.id, blue_claim.id)] = task
+            for user_id in singles:
+                if user_id in claims:
+                    self.track_prerender_task(guild, self.bot.fetch_versus_portrait(claims[user_id].image_url))
+            logger.debug(f"{guild.name}[{guild.id}] | "
+                         f"Pre-rendering {len(images)} battles and {len(singles)} waiting users for the next Waifu War tick")
+        except Exception as err:
+            logger.error(f"{guild.name}[{guild.id}] | Pre-rendering the next Waifu War battles failed: {err}")
+
+    async def take_prerendered_claim(self, guild: disnake.Guild, user: disnake.User) -> Claim:
+        """ The user's pre-picked claim if it is still married, otherwise a fresh random one. """
+        claim = self.prerendered_claims.get(guild.id, {}).pop(user.id, None)
+        if claim:
+            claim = await self.bot.mongo.fetch_claim(claim.id)
+            if claim and claim.user_id == user.id and claim.index is not None and claim.state == WaifuState.ACTIVE:
+                return claim
+        return await self.bot.mongo.fetch_random_harem_married(user)
+
+    async def take_prerendered_image(self, guild: disnake.Guild, red_claim: Claim, blue_claim: Claim) -> str:
+        """ The pre-rendered VS image URL for the pairing, rendering it now on a miss. """
+        task = self.prerendered_images.get(guild.id, {}).pop((red_claim.id, blue_claim.id), None)
+        if task:
+            try:
+                return await task
+            except Exception:
+                pass # already logged by `log_prerender_failure`, so just render it again
+        return await self.bot.create_waifu_vs_img(red_claim, blue_claim)
+
+    @staticmethod
+    def log_prerender_failure(task: asyncio.Task) -> None:
+        """ Log a failed background task, which also marks its exception as retrieved. """
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Waifu War pre-render task failed: {task.exception()}")
+
+    def track_prerender_task(self, guild: disnake.Guild, coro: typing.Coroutine) -> asyncio.Task:
+        """ Run `coro` in the background, keeping a reference until it finishes. """
+        pending = self.prerender_tasks.setdefault(guild.id, set())
+        task = asyncio.create_task(coro)
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        task.add_done_callback(self.log_prerender_failure)
+        return task
+
+    def discard_prerendered_images(self, guild: disnake.Guild) -> None:
+        """ Cancel the renders whose pairing wasn't used, a re-rolled claim or an eliminated user. """
+        for task in self.prerendered_images.pop(guild.id, {}).values():
+            task.cancel()
+
+    def start_prerender(self, guild: disnake.Guild, bracket: Bracket, current_round: Round) -> None:
+        """ Start preparing the next battles without holding up the voting window. """
+        self.track_prerender_task(guild, self.prerender_next_battles(guild, bracket, current_round))
+
+    def discard_prerendered(self, guild: disnake.Guild) -> None:
+        """ Drop the picks that went unused at the end of a war and cancel their work. """
+        self.prerendered_claims.pop(guild.id, None)
+        self.discard_prerendered_images(guild)
+        for task in self.prerender_tasks.pop(guild.id, set()):
+            task.cancel()
+
     ##*************************************************##
     ##********              EVENTS              *******##
     ##*************************************************##
@@ -412,6 +512,35 @@ class Waifus(commands.Cog):
     async def init_waifu_war_creation(self):
         await self.bot.wait_until_ready()
 
+    @tasks.loop(count=1)
+    async def resume_waifu_wars(self):
+        """ Picks up the Waifu Wars that were running before a restart. """
+        for guild in self.bot.guilds:
+            war = await self.bot.mongo.fetch_active_war(guild)
+            if not war or guild.id in self.waifu_war_tasks:
+                continue
+
+            # If the Discord event ended while we were down, then close the war
+            waifu_war_event = await self.get_waifu_war_event(guild)
+            if not waifu_war_event or waifu_war_event.id != war.event_id or waifu_war_event.status != disnake.GuildScheduledEventStatus.active:
+                await war.set({Event.state: disnake.GuildScheduledEventStatus.completed.value})
+                logger.warning(f"{guild.name}[{guild.id}] | "
+                               f"Closed Waifu War '{war.id}' whose event is no longer active")
+                continue
+
+            # Rebuild the bracket and continue the war where it left off
+            self.brackets[guild.id] = await Bracket.load(war)
+            loop = tasks.Loop(self.waifu_wars, minutes=3.0)
+            loop.start(waifu_war_event)
+            self.waifu_war_tasks[guild.id] = loop
+            logger.info(f"{guild.name}[{guild.id}] | "
+                        f"{waifu_war_event.name}[{waifu_war_event.id}] | "
+                        f"Waifu War resumed!")
+
+    @resume_waifu_wars.before_loop
+    async def init_resume_waifu_wars(self):
+        await self.bot.wait_until_ready()
+
     @tasks.loop(minutes=1.0)
     async def waifu_housekeeping(self):
         """ Background task to check for waifu war maintenance. """
@@ -427,8 +556,8 @@ class Waifus(commands.Cog):
             # delete old waifu war threads
             await self.delete_waifu_war_threads(guild)
             
-            # end the season if it's time
-            await self.end_waifu_war_season(guild)
+        # end the season if it's time
+        await self.end_waifu_war_season()
 
     @waifu_housekeeping.before_loop
     async def init_waifu_housekeeping(self):
@@ -451,12 +580,12 @@ class Waifus(commands.Cog):
         if waifu_war_event and waifu_war_event.status != disnake.GuildScheduledEventStatus.active:
             return logger.error(f"{guild.name}[{guild.id}] started Waifu War manager but the event is inactive")
 
-        # Only create the bracket on the first pass
-        if loop.current_loop == 0:
+        # Only create the bracket on the first pass, unless it was resumed after a restart
+        if loop.current_loop == 0 and guild.id not in self.brackets:
             war = Event(
                 event_id=waifu_war_event.id,
                 guild_id=guild.id,
-                state=disnake.GuildScheduledEventStatus.active,
+                state=disnake.GuildScheduledEventStatus.active.value,
                 timestamp_start=disnake.utils.utcnow(),
                 timestamp_end=None
             )
@@ -485,17 +614,19 @@ class Waifus(commands.Cog):
                     ranking=rank
                 )
                 rank += 1
-            bracket.create_bracket()
+            await bracket.create_bracket()
+            self.brackets[guild.id] = bracket
         
         # Get the waifu war channel
         nyah_guild = await self.bot.mongo.fetch_nyah_guild(guild)
         waifu_war_channel = await guild.fetch_channel(nyah_guild.waifu_war_channel_id)
 
-        # Get the war
-        war = await self.bot.mongo.fetch_active_war(guild)
-
-        # Create a bracket object to help us
-        bracket = Bracket(war)
+        # Get the bracket, rebuilding it from the database after a restart
+        bracket = self.brackets.get(guild.id)
+        if not bracket:
+            war = await self.bot.mongo.fetch_active_war(guild)
+            bracket = await Bracket.load(war)
+            self.brackets[guild.id] = bracket
 
         #TODO Print the bracket
         # logger.debug(f"guildname[guildid] Waifu War bracket:")
@@ -520,7 +651,7 @@ class Waifus(commands.Cog):
                 title=f"Waifu War Round {current_round.number}"
             ).set_thumbnail(url=gif_url)
             round_message = await waifu_war_channel.send(embed=round_embed)
-            bracket.set_round_message_id(current_round, str(round_message.id))
+            bracket.set_round_message_id(current_round, round_message.id)
             bracket.start_round_matches(current_round)
         else:
             # Try to get the message from cache
@@ -547,13 +678,13 @@ class Waifus(commands.Cog):
             match_title = f"Match {current_match.number}"
 
             # Check if there is already a winner for this match
-            if bracket.get_match_winner(current_match):
+            if current_match.winner_id:
                 continue
             else:
                 # Add fields to represent this match if it doesn't exist
                 if not round_embed.fields or match_title not in [field.name for field in round_embed.fields]:
                     team_1_str = f"<@{current_match.user_red_id}>"
-                    team_2_str = "BYE" if current_match.user_blue_id == "BYE" else f"<@{current_match.user_blue_id}>"
+                    team_2_str = "BYE" if bracket.match_has_bye(current_match) else f"<@{current_match.user_blue_id}>"
                     round_embed.add_field(
                         name=match_title,
                         value=f"🟥 {team_1_str} 🟥 vs. 🟦 {team_2_str} 🟦",
@@ -578,12 +709,12 @@ class Waifus(commands.Cog):
                     # If the user is out of waifus, then they lose the match
                     bracket.set_match_winner(current_match, opponent_user_id)
                 else:
-                    # If the user still has active waifus then get a random one
-                    harem_waifu = await self.bot.mongo.fetch_random_harem_married(user)
+                    # If the user still has active waifus then get a random one, preferring the pre-rendered pick
+                    harem_waifu = await self.take_prerendered_claim(guild, user)
                     if user_color == "red":
-                        random_waifu_red = Claim(**harem_waifu)
+                        random_waifu_red = harem_waifu
                     elif user_color == "blue":
-                        random_waifu_blue = Claim(**harem_waifu)
+                        random_waifu_blue = harem_waifu
             
             # If there aren't waifus then there's no battle, so go next
             if not random_waifu_red or not random_waifu_blue:
@@ -593,12 +724,13 @@ class Waifus(commands.Cog):
             current_battle = bracket.create_battle(current_match, random_waifu_red, random_waifu_blue)
 
             # Create vs image
-            vs_img_url = await self.bot.create_waifu_vs_img(random_waifu_red, random_waifu_blue)
+            vs_img_url = await self.take_prerendered_image(guild, random_waifu_red, random_waifu_blue)
             
             # Create the battle embed
             ends_at = disnake.utils.utcnow() + datetime.timedelta(minutes=voting_time_min)
-            red_waifu = await self.bot.mongo.fetch_waifu(random_waifu_red.slug)
-            blue_waifu = await self.bot.mongo.fetch_waifu(random_waifu_blue.slug)
+            battle_waifus = await self.bot.mongo.fetch_waifus_by_slugs([random_waifu_red.slug, random_waifu_blue.slug])
+            red_waifu = battle_waifus[random_waifu_red.slug]
+            blue_waifu = battle_waifus[random_waifu_blue.slug]
             battle_embed = disnake.Embed(
                 title=f"{match_title}  •  Battle {current_battle.number}",
                 description=f"**__{red_waifu.name}__** vs. **__{blue_waifu.name}__**\n"
@@ -617,21 +749,32 @@ class Waifus(commands.Cog):
             battle_message = await round_message.thread.send(
                 content=str([field.value for field in round_embed.fields if field.name == match_title][0]),
                 embed=battle_embed,
-                view=WarVoteView(current_battle)
+                view=WarVoteView(
+                    current_battle,
+                    red_name=red_waifu.name,
+                    red_image_url=random_waifu_red.image_url,
+                    blue_name=blue_waifu.name,
+                    blue_image_url=random_waifu_blue.image_url,
+                )
             )
-            bracket.set_battle_message_id(current_battle, str(battle_message.id))
+            bracket.set_battle_message_id(current_battle, battle_message.id)
 
-        # Wait for the votes to come in
+        # Every battle of this tick is made, so renders that weren't taken are stale
+        self.discard_prerendered_images(guild)
+
+        # Wait for the votes to come in, preparing the next battles in the background
+        self.start_prerender(guild, bracket, current_round)
         await asyncio.sleep(voting_time_min * 60)
 
         # Update the battles in the bracket
+        round_votes = await bracket.count_round_votes(current_round)
         for current_match in bracket.get_round_matches(current_round):
             current_battle = bracket.get_current_battle(current_match)
-            if not current_battle or bracket.get_match_winner(current_match):
+            if not current_battle or current_match.winner_id:
                 continue
 
             # Remove the voting view from the message
-            battle_message_id = bracket.get_battle_message_id(current_battle)
+            battle_message_id = current_battle.message_id
             # Try to get the message from cache
             battle_message = self.bot.get_message(int(battle_message_id))
             # If that didn't work, then get the message from history
@@ -642,19 +785,13 @@ class Waifus(commands.Cog):
             await battle_message.edit(view=None)
 
             # Count the votes
-            vote_info = bracket.count_battle_votes(current_battle)
+            vote_info = round_votes[current_battle.id]
             
             # Update the user's harem that has the losing waifu
             losing_claim = await self.bot.mongo.fetch_claim(vote_info["loser"]["id"])
-            losing_claim.index = None
-            losing_claim.state = WaifuState.NULL
-            await self.bot.mongo.update_claim(losing_claim)
+            await self.bot.mongo.remove_from_harem(losing_claim, WaifuState.NULL)
             losing_user = self.bot.get_user(int(losing_claim.user_id))
             
-            # Reindex the losing user's waifus
-            losing_harem = await self.bot.mongo.fetch_harem(losing_user)
-            await losing_harem.reindex()
-            
             # Get the user's waifu that won
             winning_claim = await self.bot.mongo.fetch_claim(vote_info["winner"]["id"])
             winning_user = self.bot.get_user(int(winning_claim.user_id))
@@ -687,7 +824,7 @@ class Waifus(commands.Cog):
             # If the loser doesn't have any waifus left, then set the winner of the match
             if await self.bot.mongo.fetch_harem_married_count(losing_user) == 0:
                 # If the user is out of waifus, then they lose the match
-                bracket.set_match_winner(current_match, str(winning_user.id))
+                bracket.set_match_winner(current_match, winning_user.id)
                 embed = disnake.Embed(
                     description=f"{winning_user.mention} won the match!",
                     color=disnake.Color.random()
@@ -697,7 +834,7 @@ class Waifus(commands.Cog):
         # Change the embed's fields to mark the match winner if there is one
         for current_match in bracket.get_round_matches(current_round):
             match_title = f"Match {current_match.number}"
-            winner_id = bracket.get_match_winner(current_match)
+            winner_id = current_match.winner_id
             if winner_id:
                 for i, field in enumerate(round_embed.fields):
                     if field.name == match_title:
@@ -736,11 +873,14 @@ class Waifus(commands.Cog):
             for user_id in bracket.get_round_participant_ids(current_round):
                 user = await guild.fetch_member(int(user_id))
                 nyah_player = await self.bot.mongo.fetch_nyah_player(user)
-                await nyah_player.add_user_xp(Experience.WAR_ROUND.value)
+                await self.bot.mongo.add_user_xp(nyah_player, Experience.WAR_ROUND.value)
 
             # War is over if this round was the last
             if bracket.last_round(current_round):
                 await self.end_waifu_war_event(waifu_war_event)
+                await bracket.close()
+                del self.brackets[guild.id]
+                self.discard_prerendered(guild)
 
                 # TODO Put winner's waifus on cooldown 
                 # set state to COOLDOWN and timestamp_cooldown to now
@@ -753,21 +893,21 @@ class Waifus(commands.Cog):
                     user = await guild.fetch_member(int(user_id))
                     nyah_player = await self.bot.mongo.fetch_nyah_player(user)
                     if user_id == winner_id:
-                        await nyah_player.add_user_money(Prices.PAYOUT_WAR_FIRST.value)
-                        await nyah_player.add_user_xp(Experience.WAR_FIRST.value)
+                        await self.bot.mongo.add_user_money(nyah_player, Prices.PAYOUT_WAR_FIRST.value)
+                        await self.bot.mongo.add_user_xp(nyah_player, Experience.WAR_FIRST.value)
                         ending_embed.title = f"Congratulations to {user.name} for winning the Waifu War!"
                         ending_embed.description += f"- {user.mention} won `{Prices.PAYOUT_WAR_FIRST.value:,}` {Emojis.COINS} and `{Experience.WAR_FIRST.value}` XP!"
                         ending_embed.set_thumbnail(url=user.display_avatar.url)
                     else:
-                        await nyah_player.add_user_money(Prices.PAYOUT_WAR_SECOND.value)
-                        await nyah_player.add_user_xp(Experience.WAR_SECOND.value)
+                        await self.bot.mongo.add_user_money(nyah_player, Prices.PAYOUT_WAR_SECOND.value)
+                        await self.bot.mongo.add_user_xp(nyah_player, Experience.WAR_SECOND.value)
                         ending_embed.description += f"- {user.mention} won `{Prices.PAYOUT_WAR_SECOND.value:,}` {Emojis.COINS} and `{Experience.WAR_SECOND.value}` XP!"
                 # TODO test this
                 await waifu_war_channel.send(embed=ending_embed)
 
                 # Reindex all participant's waifus
                 for participant in bracket.participants:
-                    if participant.user_id == "BYE":
+                    if participant.user_id == BYE:
                         continue
                     user = await guild.fetch_member(int(participant.user_id))
                     harem = await self.bot.mongo.fetch_harem(user)
@@ -881,11 +1021,11 @@ class Waifus(commands.Cog):
         minigame = random.choice(["guess_name", "guess_bust", "guess_age", "smash_or_pass"])
 
         # Get very popular characters for the minigame
-        mutual_aggregation = {"$match": {"popularity_rank": {"$lt": 600}}}
+        max_rank = 600
 
         match minigame:
             case "guess_name":
-                waifu = await self.bot.mongo.fetch_random_waifu([mutual_aggregation])
+                waifu = await self.bot.mongo.fetch_random_waifu(max_rank=max_rank)
                 answer = waifu.name
 
                 embed = disnake.Embed(
@@ -899,7 +1039,7 @@ class Waifus(commands.Cog):
                 wrong_description = f"- No, this is **__{answer}__** :(\n"
         
             case "guess_bust":
-                waifu = await self.bot.mongo.fetch_random_waifu([{"$match": {"bust": {"$ne": None}}}, mutual_aggregation])
+                waifu = await self.bot.mongo.fetch_random_waifu("has_bust", max_rank=max_rank)
                 answer = waifu.bust
 
                 embed = disnake.Embed(
@@ -913,7 +1053,7 @@ class Waifus(commands.Cog):
                 wrong_description = f"- Sorry, **__{waifu.name}'s__** tits are {answer} :(\n"
         
             case "guess_age":
-                waifu = await self.bot.mongo.fetch_random_waifu([{"$match": {"age": {"$ne": None}}}, mutual_aggregation])
+                waifu = await self.bot.mongo.fetch_random_waifu("has_age", max_rank=max_rank)
                 answer = waifu.age
 
                 embed = disnake.Embed(
@@ -927,7 +1067,7 @@ class Waifus(commands.Cog):
                 wrong_description = f"- Sorry, **__{waifu.name}__** is {answer} :(\n"
 
             case "smash_or_pass":
-                waifu = await self.bot.mongo.fetch_random_waifu([{"$match": {"age": {"$gte": 18}}}, mutual_aggregation])
+                waifu = await self.bot.mongo.fetch_random_waifu("adult", max_rank=max_rank)
                 
                 femboy = False
                 if "femboy" in waifu.description.lower():
@@ -958,7 +1098,7 @@ class Waifus(commands.Cog):
         # Set timestamp in db
         nyah_player = await self.bot.mongo.fetch_nyah_player(inter.author)
         nyah_player.timestamp_last_minigame = disnake.utils.utcnow()
-        await self.bot.mongo.update_nyah_player(nyah_player)
+        await self.bot.mongo.update_nyah_player(nyah_player, flush=True) # cooldown must be visible while the view is open
 
         # Wait for the user to answer
         await minigame_view.wait()
@@ -981,8 +1121,8 @@ class Waifus(commands.Cog):
                             f"and `{Experience.MINIGAME_WIN.value}` XP",
                 color=disnake.Color.green(),
             )
-            await nyah_player.add_user_money(win_amount)
-            await nyah_player.add_user_xp(Experience.MINIGAME_WIN.value, inter.author, inter.channel)
+            await self.bot.mongo.add_user_money(nyah_player, win_amount)
+            await self.bot.mongo.add_user_xp(nyah_player, Experience.MINIGAME_WIN.value, inter.author, inter.channel)
         else:
             logger.debug(f"{inter.author.name} lost minigame '{minigame}'")
             result_embed = disnake.Embed(
@@ -991,7 +1131,7 @@ class Waifus(commands.Cog):
                             f"- You lost `{lose_amount:,}` {Emojis.COINS}",
                 color=disnake.Color.red(),
             )
-            await nyah_player.add_user_money(lose_amount)
+            await self.bot.mongo.add_user_money(nyah_player, lose_amount)
 
         return await inter.edit_original_response(embeds=[embed, result_embed], view=None)
 
@@ -1064,9 +1204,9 @@ class Waifus(commands.Cog):
             embeds.append(embed)
         
         dex_view = await WaifuDexView.create_instance(embeds, inter.author)
-        await dex_view.initialize_footers()
         message = await inter.edit_original_response(embed=embeds[0], view=dex_view)
         dex_view.message = message
+        await dex_view.initialize_footers()
         return
 
     @commands.slash_command()
@@ -1117,16 +1257,12 @@ class Waifus(commands.Cog):
         claim.message_id=message.id
         claim.jump_url=message.jump_url
         claim.timestamp=message.created_at
-        await self.bot.mongo.insert_claim(claim)
-
-        # Update harem in db
-        harem = await self.bot.mongo.fetch_harem(inter.author)
-        await harem.reindex()
+        await self.bot.mongo.insert_harem_claim(claim)
 
         # Update user info in db
         nyah_player.timestamp_last_claim = disnake.utils.utcnow()
         await self.bot.mongo.update_nyah_player(nyah_player)
-        await nyah_player.add_user_xp(Experience.CLAIM.value, inter.author, inter.channel)
+        await self.bot.mongo.add_user_xp(nyah_player, Experience.CLAIM.value, inter.author, inter.channel)
 
         logger.info(f"{inter.guild.name}[{inter.guild.id}] | "
                              f"{inter.channel.name}[{inter.channel.id}] | "
@@ -1152,7 +1288,7 @@ class Waifus(commands.Cog):
 
             result = await self.bot.mongo.fetch_waifus_by_name_and_series(name, series)
         else:
-            result = await self.bot.mongo.fetch_waifus_by_name(name)
+            result = await self.bot.mongo.fetch_waifus_by_name(name, limit=1)
         waifu = result[0]
 
         if not result:
@@ -1181,7 +1317,7 @@ class Waifus(commands.Cog):
         """ List your harem! """
         await inter.response.defer()
 
-        harem = await self.bot.mongo.fetch_harem(inter.author)
+        harem = await self.bot.mongo.fetch_harem_summaries(inter.author, trusted=True)
         
         if not harem:
             return await inter.edit_original_response(
@@ -1270,10 +1406,10 @@ class Waifus(commands.Cog):
                 embed=ErrorEmbed(f"{inter.author.mention} your harem is empty!\n\nUse `/getmywaifu` to get started")
             )
         
+        waifus = await self.bot.mongo.fetch_waifus_by_slugs([claim.slug for claim in harem])
         embeds: typing.List[disnake.Embed] = list()
         for claim in harem:
-            w = await self.bot.mongo.fetch_waifu(claim.slug)
-            embed = WaifuHaremEmbed(w, claim)
+            embed = WaifuHaremEmbed(waifus[claim.slug], claim)
             embed.set_footer(text=claim.id)
             embeds.append(embed)
 
@@ -1356,23 +1492,19 @@ class Waifus(commands.Cog):
         inter: disnake.ApplicationCommandInteraction,
         user_input: str
     ) -> list:
-        harem_size = await self.bot.mongo.fetch_harem_count(inter.author)
-        if harem_size == 0:
+        harem = await self.bot.mongo.fetch_harem_summaries(inter.author, trusted=True)
+        if len(harem) == 0:
             return [f"Your harem is empty!"]
         
-        if user_input.isdigit() and int(user_input) <= harem_size:
-            index = int(user_input)
-            claim = await self.bot.mongo.fetch_claim_by_index(inter.author, index)
-            waifu = await self.bot.mongo.fetch_waifu(claim.slug)
-            formatted_name = f"{claim.index}. {waifu.name}"
+        selected = [claim for claim in harem if user_input.isdigit() and claim.index == int(user_input)]
+        if selected:
+            claim = selected[0]
+            formatted_name = f"{claim.index}. {claim.name}"
             waifu_names = [formatted_name]
         else:
-            harem = await self.bot.mongo.fetch_harem(inter.author)
-            
             waifu_names = []
             for claim in harem:
-                waifu = await self.bot.mongo.fetch_waifu(claim.slug)
-                formatted_name = f"{claim.index}. {waifu.name} ({claim.skill_str_short})"
+                formatted_name = f"{claim.index}. {claim.name} ({claim.skill_str_short})"
                 waifu_names.append(formatted_name)
         
         return deque(waifu_names, maxlen=25)
@@ -1386,8 +1518,8 @@ class Waifus(commands.Cog):
     ) -> list:
         if not user_input:
             user_input = "a"
-        waifus = await self.bot.mongo.fetch_waifus_by_name(user_input)
-        return deque([f"{waifu.name} [{waifu.series[0]}]" for waifu in waifus if len(waifu.series)], maxlen=25)
+        entries = await self.bot.mongo.search_waifu_names(user_input, limit=50)
+        return [f"{entry.name} [{entry.series}]" for entry in entries if entry.series][:25]
 
     @waifudex.autocomplete("series")
     async def waifu_series_autocomplete(
@@ -1395,9 +1527,7 @@ class Waifus(commands.Cog):
         inter: disnake.ApplicationCommandInteraction,
         user_input: str
     ) -> list:
-        result = await self.bot.mongo.fetch_waifu_series()
-        comp = re.compile(f"(?i)^{user_input}")
-        return deque(filter(comp.match, result), maxlen=25)
+        return await self.bot.mongo.fetch_waifu_series(user_input, limit=25)
 
     @waifudex.autocomplete("tag")
     async def waifu_tag_autocomplete(
@@ -1405,9 +1535,7 @@ class Waifus(commands.Cog):
         inter: disnake.ApplicationCommandInteraction,
         user_input: str
     ) -> list:
-        result = await self.bot.mongo.fetch_waifu_tags()
-        comp = re.compile(f"(?i)^{user_input}")
-        return deque(filter(comp.match, result), maxlen=25)
+        return await self.bot.mongo.fetch_waifu_tags(user_input, limit=25)
 
 
 def setup(bot: commands.Bot):
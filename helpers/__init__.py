@@ -1,4 +1,7 @@
-from .mongo import Mongo
+from .catalog import WaifuCatalog, waifu_catalog
+from .ladder import DuelLadder, duel_ladder
+from .mongo import Mongo, migrate_vote_index
+from .image_cache import ImageCache
 from .api import API
 from .embeds import (
     SuccessEmbed,
@@ -1,40 +1,134 @@
 import os
+import asyncio
+from typing import Dict
 
+import aiohttp
 import aiofiles
 import aiohttp_client_cache
 from loguru import logger
 
+from helpers.image_cache import ImageCache
+
+IMAGE_CHUNK_SIZE = 64 * 1024
+IMAGE_SIGNATURES = {
+    "image/png": (b"\x89PNG\r\n\x1a\n",),
+    "image/jpeg": (b"\xff\xd8\xff",),
+    "image/gif": (b"GIF87a", b"GIF89a"),
+    "image/webp": (b"RIFF",), # followed by the size and then b"WEBP"
+}
+# generic types some CDNs and buckets serve images as, aiohttp also reports a missing type as the first
+GENERIC_CONTENT_TYPES = ("application/octet-stream", "binary/octet-stream")
+
+
+def image_type_from_header(header: bytes) -> str | None:
+    """ The image type that the first bytes of a file belong to, if any. """
+    for content_type, signatures in IMAGE_SIGNATURES.items():
+        if header.startswith(signatures):
+            if content_type == "image/webp" and header[8:12] != b"WEBP":
+                continue
+            return content_type
+    return None
+
 
 class API():
-    def __init__(self, session: aiohttp_client_cache.CachedSession, temp_dir: str) -> None:
+    def __init__(
+        self,
+        session: aiohttp_client_cache.CachedSession,
+        image_cache: ImageCache,
+        download_session: aiohttp.ClientSession,
+        max_image_bytes: int = 10 * 1024**2,
+        max_concurrent_downloads: int = 8,
+        download_timeout: float = 30
+    ) -> None:
         self.session = session
-        self.temp_dir = temp_dir
+        self.image_cache = image_cache
+        # images are streamed, which the response cache of `session` would buffer in memory
+        self.download_session = download_session
+        self.max_image_bytes = max_image_bytes
+        self.download_timeout = aiohttp.ClientTimeout(total=download_timeout)
+        # bounds the memory held by downloads to this many chunks
+        self.download_semaphore = asyncio.Semaphore(max_concurrent_downloads)
+        # url -> the one download in flight for it, shared by every caller
+        self.downloads_in_flight: Dict[str, asyncio.Task] = {}
+        self.downloads_started = 0
+        self.downloads_coalesced = 0
 
     async def download_image(self, url: str) -> str | None:
         """ Download an image from a URL.
 
-            LIMIT: N/A
+            Callers asking for a URL that is already being downloaded wait
+            for that download and share its result instead of starting
+            another one.
+
+            LIMIT: `max_concurrent_downloads` at a time.
         
             Returns
             -------
             `str`: The path to the downloaded image.
         """
+        image_path = self.image_cache.lookup(url)
+        if image_path:
+            return image_path
+
+        task = self.downloads_in_flight.get(url)
+        if task:
+            self.downloads_coalesced += 1
+        else:
+            self.downloads_started += 1
+            task = asyncio.create_task(self._download_image(url))
+            self.downloads_in_flight[url] = task
+            task.add_done_callback(lambda _: self.downloads_in_flight.pop(url, None))
+        # a caller giving up must not cancel the download for the others
+        return await asyncio.shield(task)
+
+    async def _download_image(self, url: str) -> str | None:
+        """ Stream an image from a URL into the image cache.
+
+            The body is streamed to disk in chunks and rejected as soon as it
+            goes over `max_image_bytes`, when it is served as something other
+            than an image or generic binary data, or when its first bytes
+            aren't those of a PNG, JPEG, GIF or WEBP.
+        """
+        temp_path = self.image_cache.temp_path(url)
         try:
-            image_filename = os.path.basename(url).split("?")[0]
-            image_path = os.path.join(self.temp_dir, image_filename)
-
-            if not os.path.exists(image_path):
-                async with self.session.get(url) as response:
-                    if response.status != 200:
-                        logger.error(f"Downloading image {url} returned status code `{response.status}`")
-                        return None
-                    async with aiofiles.open(image_path, mode="wb") as f:
-                        await f.write(await response.read())
-                    logger.info(f"Downloaded image {image_path}")
+            async with self.download_semaphore, self.download_session.get(url, timeout=self.download_timeout) as response:
+                if response.status != 200:
+                    logger.error(f"Downloading image {url} returned status code `{response.status}`")
+                    return None
+                if not response.content_type.startswith("image/") and response.content_type not in GENERIC_CONTENT_TYPES:
+                    logger.error(f"Downloading image {url} returned content type `{response.content_type}`")
+                    return None
+                if response.content_length and response.content_length > self.max_image_bytes:
+                    logger.error(f"Downloading image {url} is {response.content_length:,} bytes, over the {self.max_image_bytes:,} byte limit")
+                    return None
+
+                size = 0
+                header = b""
+                async with aiofiles.open(temp_path, mode="wb") as f:
+                    async for chunk in response.content.iter_chunked(IMAGE_CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.max_image_bytes:
+                            logger.error(f"Downloading image {url} went over the {self.max_image_bytes:,} byte limit")
+                            return None
+                        if len(header) < 12:
+                            header += chunk[:12 - len(header)]
+                        await f.write(chunk)
+
+            if not image_type_from_header(header):
+                logger.error(f"Downloading image {url} returned data that isn't an image")
+                return None
+            image_path = self.image_cache.commit(url, temp_path)
+            logger.info(f"Downloaded image {url} to {image_path} ({size:,} bytes)")
             return image_path
+        except asyncio.TimeoutError:
+            logger.error(f"Downloading image {url} timed out after {self.download_timeout.total}s")
+            return None
         except Exception as err:
             logger.error(f"Downloading image returned invalid data! {err}")
             return None
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
 
     async def search_jikan_series(self, query: str) -> str | None:
         """ Search for an anime series on MyAnimeList using Jikan.
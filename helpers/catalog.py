@@ -0,0 +1,239 @@
+import time
+import uuid
+import random
+import asyncio
+from bisect import bisect_left
+from collections import Counter
+from typing import List, Dict, Any, Callable, NamedTuple
+
+from loguru import logger
+
+import models
+
+
+class CatalogEntry(NamedTuple):
+    id: uuid.UUID
+    name: str
+    series: str | None # first series only, used for display
+    popularity_rank: int | None
+    bust: str | None
+    age: int | None
+
+
+POOL_FILTERS: Dict[str, Callable[[CatalogEntry], bool]] = {
+    "ranked": lambda entry: True,
+    "has_bust": lambda entry: entry.bust is not None,
+    "has_age": lambda entry: entry.age is not None,
+    "adult": lambda entry: entry.age is not None and entry.age >= 18,
+}
+
+
+class WaifuPool():
+    """ Entries matching one named filter, sorted by popularity rank so that
+        rank limits are a pair of bisects instead of a query.
+    """
+    def __init__(self, entries: List[CatalogEntry]) -> None:
+        self.entries = sorted(entries, key=lambda entry: entry.popularity_rank)
+        self.ranks = [entry.popularity_rank for entry in self.entries]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def rank_slice(self, min_rank: int | None = None, max_rank: int | None = None) -> range:
+        """ Positions of the entries with `min_rank <= popularity_rank < max_rank`. """
+        start = bisect_left(self.ranks, min_rank) if min_rank is not None else 0
+        stop = bisect_left(self.ranks, max_rank) if max_rank is not None else len(self.ranks)
+        return range(start, max(start, stop))
+
+    def sample(
+        self,
+        number: int,
+        min_rank: int | None = None,
+        max_rank: int | None = None,
+        exclude: Dict[str, Any] | None = None
+    ) -> List[CatalogEntry]:
+        """ Draw up to `number` distinct entries uniformly from the rank window.
+
+            Parameters
+            ----------
+            number: `int`
+                How many entries to draw.
+            min_rank: `int`
+                Lowest popularity rank allowed (inclusive).
+            max_rank: `int`
+                Highest popularity rank allowed (exclusive).
+            exclude: `Dict[str, Any]`
+                Entry attributes that must not equal the given values.
+        """
+        positions = self.rank_slice(min_rank, max_rank)
+        if not exclude:
+            return [self.entries[i] for i in random.sample(positions, min(number, len(positions)))]
+
+        def allowed(entry: CatalogEntry) -> bool:
+            return all(getattr(entry, key) != value for key, value in exclude.items())
+
+        # exclusions are rare hits, so rejection sampling almost never retries
+        result = []
+        seen = set()
+        for _ in range(number * 10):
+            if len(result) == number or len(seen) == len(positions):
+                return result
+            i = random.choice(positions)
+            if i in seen:
+                continue
+            seen.add(i)
+            if allowed(self.entries[i]):
+                result.append(self.entries[i])
+
+        candidates = [self.entries[i] for i in positions if i not in seen and allowed(self.entries[i])]
+        return result + random.sample(candidates, min(number - len(result), len(candidates)))
+
+
+class CatalogTerms():
+    """ Distinct values of a list field (series, tags) with how many
+        characters carry each, ordered from most to least common.
+    """
+    def __init__(self, counts: Counter) -> None:
+        self.terms = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        self.keys = [term.casefold() for term, _ in self.terms]
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def search(self, query: str, limit: int = 25) -> List[str]:
+        """ Prefix matches first, then substring matches, each by popularity. """
+        query = query.casefold()
+        prefix_matches = []
+        substring_matches = []
+        for key, (term, _) in zip(self.keys, self.terms):
+            if key.startswith(query):
+                prefix_matches.append(term)
+                if len(prefix_matches) == limit:
+                    break
+            elif len(substring_matches) < limit and query in key:
+                substring_matches.append(term)
+        return (prefix_matches + substring_matches)[:limit]
+
+
+class WaifuCatalog():
+    """ Compact in-process projection of the `core` collection.
+
+        Built at startup and rebuilt lazily after `invalidate` or once
+        `refresh_interval` seconds have passed, which also picks up writes
+        made by the scraper outside of the bot.
+    """
+    PROJECTION = {
+        "_id": True,
+        "name": True,
+        "series": True,
+        "tags": True,
+        "bust": True,
+        "age": True,
+        "popularity_rank": True,
+        "like_rank": True,
+        "trash_rank": True,
+    }
+
+    def __init__(self, refresh_interval: float = 3600) -> None:
+        self.refresh_interval = refresh_interval
+        self.pools: Dict[str, WaifuPool] = {}
+        self.names: List[CatalogEntry] = []
+        self.name_keys: List[str] = []
+        self.series = CatalogTerms(Counter())
+        self.tags = CatalogTerms(Counter())
+        self.loaded_at: float | None = None
+        self.lock = asyncio.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.refresh_interval
+
+    def invalidate(self) -> None:
+        self.loaded_at = None
+
+    def build(self, documents: List[Dict[str, Any]]) -> None:
+        """ Rebuild every pool and index from raw `core` documents. """
+        entries = []
+        ranked = []
+        series_counts = Counter()
+        tag_counts = Counter()
+        for document in documents:
+            _id = document["_id"]
+            series = document.get("series")
+            series_counts.update(series or [])
+            tag_counts.update(document.get("tags") or [])
+            entry = CatalogEntry(
+                id=_id if isinstance(_id, uuid.UUID) else uuid.UUID(bytes=_id),
+                name=document["name"],
+                series=series[0] if series else None,
+                popularity_rank=document.get("popularity_rank"),
+                bust=document.get("bust"),
+                age=document.get("age"),
+            )
+            entries.append(entry)
+            if document.get("popularity_rank") is not None and document.get("like_rank") is not None and document.get("trash_rank") is not None:
+                ranked.append(entry)
+
+        self.pools = {
+            name: WaifuPool([entry for entry in ranked if predicate(entry)])
+            for name, predicate in POOL_FILTERS.items()
+        }
+
+        # same names are ordered by popularity so the best known character comes first
+        self.names = sorted(entries, key=lambda entry: (entry.name.casefold(), entry.popularity_rank or float("inf")))
+        self.name_keys = [entry.name.casefold() for entry in self.names]
+        self.series = CatalogTerms(series_counts)
+        self.tags = CatalogTerms(tag_counts)
+        self.loaded_at = time.monotonic()
+
+    def _search_names(self, prefix: str, limit: int | None) -> List[CatalogEntry]:
+        prefix = prefix.casefold()
+        result = []
+        for i in range(bisect_left(self.name_keys, prefix), len(self.name_keys)):
+            if not self.name_keys[i].startswith(prefix) or len(result) == limit:
+                break
+            result.append(self.names[i])
+        return result
+
+    async def _load(self) -> None:
+        start = time.perf_counter()
+        documents = await models.Waifu.get_motor_collection().find({}, self.PROJECTION).to_list(None)
+        self.build(documents)
+        logger.info(f"Built waifu catalog from {len(documents):,} characters in {time.perf_counter() - start:.2f}s")
+
+    async def refresh(self) -> None:
+        async with self.lock:
+            await self._load()
+
+    async def ensure_loaded(self) -> None:
+        if self.is_stale:
+            async with self.lock:
+                if self.is_stale: # another task may have rebuilt it while we waited
+                    await self._load()
+
+    async def sample(
+        self,
+        number: int,
+        pool: str = "ranked",
+        min_rank: int | None = None,
+        max_rank: int | None = None,
+        exclude: Dict[str, Any] | None = None
+    ) -> List[CatalogEntry]:
+        await self.ensure_loaded()
+        return self.pools[pool].sample(number, min_rank, max_rank, exclude)
+
+    async def search_names(self, prefix: str, limit: int | None = 25) -> List[CatalogEntry]:
+        """ Case-insensitive name prefix lookup, capped at `limit` results. """
+        await self.ensure_loaded()
+        return self._search_names(prefix, limit)
+
+    async def search_series(self, query: str, limit: int = 25) -> List[str]:
+        await self.ensure_loaded()
+        return self.series.search(query, limit)
+
+    async def search_tags(self, query: str, limit: int = 25) -> List[str]:
+        await self.ensure_loaded()
+        return self.tags.search(query, limit)
+
+
+waifu_catalog = WaifuCatalog()
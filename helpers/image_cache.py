@@ -0,0 +1,121 @@
+import os
+import uuid
+import hashlib
+from collections import OrderedDict
+
+import aiofiles
+from loguru import logger
+
+
+class ImageCache():
+    """ Size-bounded on-disk cache of images, keyed by a hash of their URL or name.
+
+        Files are written atomically (temporary file plus rename) and evicted
+        least recently used first once `max_bytes` is exceeded. Files left
+        from a previous run are adopted, oldest first, so nothing has to be
+        downloaded again after a restart.
+    """
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024**2) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, int] = OrderedDict() # key -> size, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.scan()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @staticmethod
+    def key(name: str) -> str:
+        return hashlib.sha256(name.encode()).hexdigest()
+
+    def path(self, name: str) -> str:
+        """ Where the file for `name` lives, whether or not it is cached yet. """
+        return os.path.join(self.directory, self.key(name))
+
+    def scan(self) -> None:
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith(".tmp"): # interrupted write
+                os.remove(entry.path)
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+        logger.debug(f"Adopted {len(self.entries):,} cached images ({self.total_bytes:,} bytes)")
+
+    def lookup(self, name: str) -> str | None:
+        """ Return the cached path for `name`, or `None` on a miss. """
+        key = self.key(name)
+        path = os.path.join(self.directory, key)
+        if key in self.entries and os.path.exists(path):
+            self.entries.move_to_end(key)
+            os.utime(path) # keep the recency order across restarts
+            self.hits += 1
+            return path
+
+        if key in self.entries: # removed from disk behind our back
+            self.total_bytes -= self.entries.pop(key)
+        self.misses += 1
+        return None
+
+    def record(self, name: str) -> str:
+        """ Track a file that was already written to `path(name)`. """
+        key = self.key(name)
+        path = os.path.join(self.directory, key)
+        size = os.path.getsize(path)
+        self.total_bytes += size - self.entries.pop(key, 0)
+        self.entries[key] = size
+        self.evict()
+        return path
+
+    def temp_path(self, name: str) -> str:
+        """ A unique scratch file for writing `name`, swept by `scan` if left behind. """
+        return f"{self.path(name)}.{uuid.uuid4().hex}.tmp"
+
+    def commit(self, name: str, temp_path: str) -> str:
+        """ Move a finished `temp_path` into place for `name` and track it. """
+        os.replace(temp_path, self.path(name))
+        return self.record(name)
+
+    async def write(self, name: str, data: bytes) -> str:
+        """ Atomically store `data` for `name` and return its path. """
+        temp_path = self.temp_path(name)
+        async with aiofiles.open(temp_path, mode="wb") as f:
+            await f.write(data)
+        return self.commit(name, temp_path)
+
+    def evict(self) -> int:
+        """ Remove least recently used files until the cache fits its budget.
+
+            Returns
+            -------
+            `int`
+                The number of files removed.
+        """
+        evicted = 0
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, key))
+            except FileNotFoundError:
+                pass
+            evicted += 1
+        self.evictions += evicted
+        return evicted
@@ -0,0 +1,94 @@
+from bisect import bisect_left, insort
+from typing import List, Dict, Tuple
+
+
+class DuelLadder():
+    """ Score-sorted list of the players that can be matched in a duel.
+
+        Only players with exactly `required_marriages` married claims are on
+        the ladder. Scores and married counts are kept for every known player
+        so that eligibility can be re-evaluated without touching the database.
+    """
+    def __init__(self) -> None:
+        self.entries: List[Tuple[int, int]] = [] # (score, user_id), eligible players only
+        self.scores: Dict[int, int] = {}
+        self.married: Dict[int, int] = {}
+        self.required_marriages: int | None = None
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def invalidate(self) -> None:
+        self.loaded = False
+
+    def is_eligible(self, user_id: int) -> bool:
+        return user_id in self.scores and self.married.get(user_id, 0) == self.required_marriages
+
+    def build(self, scores: Dict[int, int], married: Dict[int, int], required_marriages: int) -> None:
+        self.scores = dict(scores)
+        self.married = dict(married)
+        self.required_marriages = required_marriages
+        self.entries = sorted(
+            (score, user_id) for user_id, score in self.scores.items() if self.is_eligible(user_id)
+        )
+        self.loaded = True
+
+    def _remove(self, user_id: int) -> None:
+        if not self.is_eligible(user_id):
+            return
+        position = bisect_left(self.entries, (self.scores[user_id], user_id))
+        if position < len(self.entries) and self.entries[position] == (self.scores[user_id], user_id):
+            del self.entries[position]
+
+    def _place(self, user_id: int) -> None:
+        if self.is_eligible(user_id):
+            insort(self.entries, (self.scores[user_id], user_id))
+
+    def update_score(self, user_id: int, score: int) -> None:
+        if self.scores.get(user_id) == score:
+            return
+        self._remove(user_id)
+        self.scores[user_id] = score
+        self._place(user_id)
+
+    def update_married(self, user_id: int, married: int) -> None:
+        if user_id not in self.scores or self.married.get(user_id, 0) == married:
+            self.married[user_id] = married
+            return
+        self._remove(user_id)
+        self.married[user_id] = married
+        self._place(user_id)
+
+    def set_required_marriages(self, required_marriages: int) -> None:
+        if required_marriages != self.required_marriages:
+            self.build(self.scores, self.married, required_marriages)
+
+    def neighbors(self, user_id: int, score: int, count: int = 2) -> List[Tuple[int, int]]:
+        """ Up to `count` eligible players on either side of `score`, not including `user_id`.
+
+            `user_id` is skipped wherever it sits, since the ladder may hold
+            an older score for it than `score`.
+
+            Returns
+            -------
+            List[Tuple[`int`, `int`]]
+                `(score, user_id)` pairs, lowest score first.
+        """
+        position = bisect_left(self.entries, (score, user_id))
+        below = []
+        for entry in reversed(self.entries[:position]):
+            if len(below) == count:
+                break
+            if entry[1] != user_id:
+                below.append(entry)
+        above = []
+        for entry in self.entries[position:]:
+            if len(above) == count:
+                break
+            if entry[1] != user_id:
+                above.append(entry)
+        return below[::-1] + above
+
+
+duel_ladder = DuelLadder()
@@ -1,76 +1,174 @@
+import time
 import uuid
-from typing import List, Any, Union
+import datetime
+from typing import List, Dict, Any, Union
 
+import bson
 import disnake
 import pymongo
-from beanie.operators import Set, NotIn
+from beanie import UpdateResponse
+from beanie.operators import Set, In, NotIn
+from loguru import logger
 
 import models
-from utils.constants import WaifuState
+import utils
+from helpers.catalog import CatalogEntry, waifu_catalog
+from helpers.ladder import duel_ladder
+from utils.constants import Emojis, WaifuState, Tiers, Prices, ItemTypes, TIER_PAYOUT_MAP
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    """ Collect every stage name in an `explain()` plan tree. """
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+async def migrate_vote_index(database: Any) -> None:
+    """ Prepare `votes` for the unique (battle_id, user_id) index before `init_beanie` builds it.
+
+        Older databases have the same key without `unique`, which `init_beanie`
+        can't replace, and may hold several votes per user and battle. Those
+        are collapsed to the latest vote and the old index is dropped. Once
+        the unique index exists this is a no-op.
+    """
+    votes = database[models.Vote.Settings.name]
+    index_name = "battle_id_1_user_id_1"
+    indexes = await votes.index_information()
+    if indexes.get(index_name, {}).get("unique"):
+        return
+
+    pipeline = [
+        {"$sort": {"timestamp": pymongo.ASCENDING}},
+        {"$group": {
+            "_id": {"battle_id": "$battle_id", "user_id": "$user_id"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    duplicate_ids = []
+    async for group in votes.aggregate(pipeline, allowDiskUse=True):
+        duplicate_ids.extend(group["ids"][:-1]) # keep the latest vote, like `upsert_vote` would
+    if duplicate_ids:
+        result = await votes.delete_many({"_id": {"$in": duplicate_ids}})
+        logger.warning(f"Removed {result.deleted_count:,} duplicate votes")
+
+    if index_name in indexes:
+        await votes.drop_index(index_name)
+        logger.warning(f"Dropped non-unique vote index '{index_name}'")
 
 
 class Mongo():
     def __init__(self):
         pass
 
+    async def check_query_plans(self) -> None:
+        """ Explain each hot query shape and log any that fall back to a collection scan. """
+        sample_uuid = bson.Binary.from_uuid(uuid.uuid4())
+        harem_states = [WaifuState.NULL.value, WaifuState.SOLD.value, WaifuState.FUSED.value]
+        query_shapes = [
+            (models.Waifu, "waifu by slug", {"slug": ""}, None),
+            (models.Waifu, "waifus by name", {"name": {"$regex": "(?i)^a"}}, None),
+            (models.Waifu, "waifus by rank", {"popularity_rank": {"$lt": 200}}, None),
+            (models.Waifu, "waifus by series", {"series": ""}, [("name", pymongo.ASCENDING)]),
+            (models.Waifu, "waifus by tag", {"tags": ""}, [("name", pymongo.ASCENDING)]),
+            (models.Waifu, "waifus by birthday", {"birthday_month": 1, "birthday_day": 1}, [("name", pymongo.ASCENDING)]),
+            (models.NyahPlayer, "player by user", {"user_id": 0}, None),
+            (models.NyahPlayer, "players by score", {"score": {"$ne": 0}}, [("score", pymongo.DESCENDING)]),
+            (models.Claim, "claims by slug", {"user_id": 0, "slug": ""}, None),
+            (models.Claim, "claim by index", {"user_id": 0, "index": 1}, None),
+            (models.Claim, "harem", {"user_id": 0, "index": {"$ne": None}, "state": {"$nin": harem_states}}, [("index", pymongo.ASCENDING)]),
+            (models.Claim, "harem by state", {"user_id": 0, "index": {"$ne": None}, "state": WaifuState.ACTIVE.value}, [("index", pymongo.ASCENDING)]),
+            (models.Vote, "votes by waifu", {"battle_id": sample_uuid, "waifu_vote_id": sample_uuid}, None),
+            (models.Vote, "vote by user", {"battle_id": sample_uuid, "user_id": 0}, None),
+            (models.Event, "active war", {"guild_id": 0, "state": 0}, None),
+        ]
+
+        for document_model, description, query, sort in query_shapes:
+            cursor = document_model.get_motor_collection().find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            try:
+                explanation = await cursor.explain()
+            except Exception as e:
+                logger.warning(f"Could not explain query '{description}': {e}")
+                continue
+            if "COLLSCAN" in _plan_stages(explanation["queryPlanner"]["winningPlan"]):
+                logger.warning(f"Query '{description}' on {document_model.get_collection_name()} is a collection scan: {query}")
+
     async def fetch_nyah_config(self) -> models.NyahConfig:
-        result = await models.NyahConfig.find_many().to_list()
-        return result[0]
+        return await models.nyah_config_cache.get()
 
     async def update_nyah_config(self, config: models.NyahConfig) -> None:
-        await config.save()
+        try:
+            await config.save()
+        except Exception:
+            # callers mutate the cached instance, drop it so the next read is authoritative
+            models.nyah_config_cache.invalidate()
+            raise
+        models.nyah_config_cache.set(config)
+        duel_ladder.set_required_marriages(config.waifu_max_marriages)
 
 
 
     async def insert_waifu(self, waifu: models.Waifu) -> None:
         await waifu.insert()
+        waifu_catalog.invalidate()
     
     async def update_waifu(self, waifu: models.Waifu) -> None:
         await waifu.save()
+        waifu_catalog.invalidate()
 
     async def fetch_waifu(self, slug: str) -> models.Waifu:
         return await models.Waifu.find_one(models.Waifu.slug == slug)
     
+    async def fetch_waifus_by_slugs(self, slugs: List[str]) -> Dict[str, models.Waifu]:
+        """ Map each slug to its character, fetched in a single `$in` query. """
+        result = await models.Waifu.find_many(In(models.Waifu.slug, list(set(slugs)))).to_list()
+        return {waifu.slug: waifu for waifu in result}
+    
     async def fetch_waifu_count(self) -> int:
         return await models.Waifu.count()
     
-    async def fetch_random_waifu(self, aggregations: List = []) -> models.Waifu:
-        pipeline = [
-            {"$match": {
-                "popularity_rank": {"$ne": None},
-                "like_rank": {"$ne": None},
-                "trash_rank": {"$ne": None}
-            }},
-            *aggregations,
-            {"$sample": {"size": 1}}
-        ]
-        result = await models.Waifu.aggregate(
-            aggregation_pipeline=pipeline,
-            projection_model=models.Waifu
-        ).to_list()
+    async def fetch_random_waifu(self, pool: str = "ranked", min_rank: int = None, max_rank: int = None) -> models.Waifu:
+        result = await self.fetch_random_waifus(1, pool, min_rank, max_rank)
         return result[0]
     
-    async def fetch_random_waifus(self, number: int, aggregations: List = []) -> List[models.Waifu]:
-        pipeline = [
-            {"$match": {
-                "popularity_rank": {"$ne": None},
-                "like_rank": {"$ne": None},
-                "trash_rank": {"$ne": None}
-            }},
-            *aggregations,
-            {"$sample": {"size": number}}
-        ]
-        result = await models.Waifu.aggregate(
-            aggregation_pipeline=pipeline,
-            projection_model=models.Waifu
-        ).to_list()
-        return result
-
-    async def fetch_waifus_by_name(self, name: str) -> List[models.Waifu]:
-        result = await models.Waifu.find_many(
-            {"name": {"$regex": f"(?i)^{name}"}}
-        ).to_list()
-        return result
+    async def fetch_random_waifus(
+        self,
+        number: int,
+        pool: str = "ranked",
+        min_rank: int = None,
+        max_rank: int = None,
+        exclude: Dict[str, Any] = None
+    ) -> List[models.Waifu]:
+        """ Sample from the in-memory catalog, then fetch the chosen documents in one query.
+
+            `min_rank` is inclusive and `max_rank` is exclusive. `exclude` maps
+            catalog fields (`name`, `bust`, `age`) to values the sample must not have.
+        """
+        entries = await waifu_catalog.sample(number, pool, min_rank, max_rank, exclude)
+        return await self.fetch_waifus_by_ids([entry.id for entry in entries])
+
+    async def fetch_waifus_by_ids(self, ids: List[uuid.UUID]) -> List[models.Waifu]:
+        result = await models.Waifu.find_many(In(models.Waifu.id, ids)).to_list()
+        waifus = {waifu.id: waifu for waifu in result}
+        return [waifus[_id] for _id in ids if _id in waifus]
+
+    async def search_waifu_names(self, name: str, limit: int = 25) -> List[CatalogEntry]:
+        return await waifu_catalog.search_names(name, limit)
+
+    async def fetch_waifus_by_name(self, name: str, limit: int = None) -> List[models.Waifu]:
+        entries = await waifu_catalog.search_names(name, limit)
+        return await self.fetch_waifus_by_ids([entry.id for entry in entries])
 
     async def fetch_waifus_by_name_and_series(self, name: str, series: str) -> List[models.Waifu]:
         return await models.Waifu.find_many(
@@ -106,39 +204,26 @@ class Mongo():
     async def check_waifu_exists(self, slug: str) -> bool:
         return await models.Waifu.find_one(models.Waifu.slug == slug) != None
 
-    async def fetch_waifu_series(self) -> List[str]:
-        pipeline = [
-            {"$unwind": "$series"},
-            {"$group": {
-                "_id": "$series"
-            }}
-        ]
-        result = await models.Waifu.aggregate(
-            aggregation_pipeline=pipeline
-        ).to_list()
-        return [doc["_id"] for doc in result]
+    async def fetch_waifu_series(self, query: str = "", limit: int = 25) -> List[str]:
+        return await waifu_catalog.search_series(query, limit)
 
-    async def fetch_waifu_tags(self) -> List[str]:
-        pipeline = [
-            {"$unwind": "$tags"},
-            {"$group": {
-                "_id": "$tags"
-            }}
-        ]
-        result = await models.Waifu.aggregate(
-            aggregation_pipeline=pipeline
-        ).to_list()
-        return [doc["_id"] for doc in result]
+    async def fetch_waifu_tags(self, query: str = "", limit: int = 25) -> List[str]:
+        return await waifu_catalog.search_tags(query, limit)
 
 
 
     async def insert_nyah_player(self, nyah_player: models.NyahPlayer) -> None:
         await nyah_player.insert()
+        duel_ladder.update_score(nyah_player.user_id, nyah_player.score)
 
-    async def update_nyah_player(self, nyah_player: models.NyahPlayer) -> None:
-        await nyah_player.save()
+    async def update_nyah_player(self, nyah_player: models.NyahPlayer, flush: bool = False) -> None:
+        await nyah_player.commit(flush)
+        duel_ladder.update_score(nyah_player.user_id, nyah_player.score)
 
     async def fetch_nyah_player(self, user: disnake.Member | disnake.User) -> models.NyahPlayer | None:
+        unit_of_work = models.current_unit_of_work.get()
+        if unit_of_work:
+            return await unit_of_work.get(user.id)
         return await models.NyahPlayer.find_one(models.NyahPlayer.user_id == user.id)
 
     async def fetch_active_nyah_players(self) -> List[models.NyahPlayer]:
@@ -158,6 +243,245 @@ class Mongo():
 
     async def update_all_nyah_players(self, field: str, value: Any) -> None:
         await models.NyahPlayer.find_all().update(Set({field: value}))
+        duel_ladder.invalidate()
+
+    async def add_user_money(self, nyah_player: models.NyahPlayer, money: int) -> int:
+        result = await models.NyahPlayer.get_motor_collection().find_one_and_update(
+            {"user_id": nyah_player.user_id},
+            [{"$set": {"money": {"$max": [0, {"$add": ["$money", money]}]}}}],
+            projection={"money": True},
+            return_document=pymongo.ReturnDocument.AFTER,
+        )
+        nyah_player.apply_atomic_update(result)
+        return nyah_player.money
+
+    async def spend_user_money(self, nyah_player: models.NyahPlayer, money: int) -> bool:
+        collection = models.NyahPlayer.get_motor_collection()
+        result = await collection.find_one_and_update(
+            {"user_id": nyah_player.user_id, "money": {"$gte": money}},
+            {"$inc": {"money": -money}},
+            projection={"money": True},
+            return_document=pymongo.ReturnDocument.AFTER,
+        )
+        if not result:
+            # not enough money, refresh the balance so callers can show how much is missing
+            result = await collection.find_one({"user_id": nyah_player.user_id}, projection={"money": True})
+            if result:
+                nyah_player.apply_atomic_update(result)
+            return False
+        nyah_player.apply_atomic_update(result)
+        return True
+
+    async def add_user_mmr(self, nyah_player: models.NyahPlayer, mmr: int) -> int:
+        result = await models.NyahPlayer.get_motor_collection().find_one_and_update(
+            {"user_id": nyah_player.user_id},
+            [{"$set": {"score": {"$max": [100, {"$add": ["$score", mmr]}]}}}],
+            projection={"score": True},
+            return_document=pymongo.ReturnDocument.AFTER,
+        )
+        nyah_player.apply_atomic_update(result)
+        duel_ladder.update_score(nyah_player.user_id, nyah_player.score)
+        return nyah_player.score
+
+    async def add_user_xp(
+        self,
+        nyah_player: models.NyahPlayer,
+        xp: int,
+        user: disnake.Member | disnake.User = None,
+        channel: disnake.TextChannel = None
+    ) -> None:
+        collection = models.NyahPlayer.get_motor_collection()
+        result = await collection.find_one_and_update(
+            {"user_id": nyah_player.user_id},
+            {"$inc": {"xp": xp}},
+            projection={"xp": True, "level": True, "money": True},
+            return_document=pymongo.ReturnDocument.AFTER,
+        )
+        nyah_player.apply_atomic_update(result)
+
+        # check if they leveled up, the level guard makes sure only one interaction pays out
+        if result["xp"] < utils.calculate_accumulated_xp(result["level"] + 1):
+            return
+
+        result = await collection.find_one_and_update(
+            {"user_id": nyah_player.user_id, "level": result["level"]},
+            {"$inc": {"level": 1, "money": Prices.PAYOUT_LEVEL_UP.value}},
+            projection={"xp": True, "level": True, "money": True},
+            return_document=pymongo.ReturnDocument.AFTER,
+        )
+        if not result:
+            return
+        nyah_player.apply_atomic_update(result)
+
+        if channel and user:
+            level_up_embed = disnake.Embed(
+                description=f"### ㊗️ Congratulations {user.mention}! You are now level {nyah_player.level}!\n\n"
+                            f"You have been awarded `{Prices.PAYOUT_LEVEL_UP.value:,}` {Emojis.COINS}",
+                color=disnake.Color.dark_teal()
+            ).set_thumbnail(url=user.avatar.url)
+            await channel.send(embed=level_up_embed)
+
+    async def add_inventory_item(self, nyah_player: models.NyahPlayer, item_type: ItemTypes, item_amount: int) -> None:
+        collection = models.NyahPlayer.get_motor_collection()
+        for _ in range(2):
+            result = await collection.find_one_and_update(
+                {"user_id": nyah_player.user_id, "inventory.type": item_type.value},
+                {"$inc": {"inventory.$.amount": item_amount}},
+                projection={"inventory": True},
+                return_document=pymongo.ReturnDocument.AFTER,
+            )
+            if result:
+                break
+
+            # no stack of this item yet, push one unless another interaction beat us to it
+            result = await collection.find_one_and_update(
+                {"user_id": nyah_player.user_id, "inventory.type": {"$ne": item_type.value}},
+                {"$push": {"inventory": {"type": item_type.value, "amount": item_amount}}},
+                projection={"inventory": True},
+                return_document=pymongo.ReturnDocument.AFTER,
+            )
+            if result:
+                break
+        if not result:
+            raise ValueError(f"Could not add {item_amount} of item {item_type} to the inventory of user {nyah_player.user_id}")
+        nyah_player.apply_atomic_update(result)
+
+    async def remove_inventory_item(self, nyah_player: models.NyahPlayer, item_type: ItemTypes, item_amount: int) -> None:
+        result = await models.NyahPlayer.get_motor_collection().find_one_and_update(
+            {
+                "user_id": nyah_player.user_id,
+                "inventory": {"$elemMatch": {"type": item_type.value, "amount": {"$gte": item_amount}}},
+            },
+            {"$inc": {"inventory.$.amount": -item_amount}},
+            projection={"inventory": True},
+            return_document=pymongo.ReturnDocument.AFTER,
+        )
+        if not result:
+            raise ValueError(f"User {nyah_player.user_id} does not have {item_amount} of item {item_type} in their inventory")
+        nyah_player.apply_atomic_update(result)
+
+    async def sell_claim(self, nyah_player: models.NyahPlayer, claim: models.Claim) -> bool:
+        if not await self.remove_from_harem(claim, WaifuState.SOLD):
+            return False # already sold by another interaction
+        await self.add_user_money(nyah_player, TIER_PAYOUT_MAP[claim.tier].value)
+        return True
+
+
+
+    async def load_duel_ladder(self) -> None:
+        """ Rebuild the duel ladder from every player's score and married count. """
+        nyah_config = await models.nyah_config_cache.get()
+        players = await models.NyahPlayer.get_motor_collection().find(
+            {}, projection={"user_id": True, "score": True}
+        ).to_list(None)
+        pipeline = [
+            {"$match": {
+                "index": {"$ne": None},
+                "state": WaifuState.ACTIVE.value,
+            }},
+            {"$group": {
+                "_id": "$user_id",
+                "count": {"$sum": 1}
+            }}
+        ]
+        married = await models.Claim.get_motor_collection().aggregate(pipeline).to_list(None)
+        duel_ladder.build(
+            scores={player["user_id"]: player["score"] for player in players},
+            married={group["_id"]: group["count"] for group in married},
+            required_marriages=nyah_config.waifu_max_marriages,
+        )
+        logger.info(f"Built duel ladder with {len(duel_ladder):,} of {len(players):,} players eligible")
+
+    async def refresh_duel_ladder_marriages(self, user_id: int) -> None:
+        if duel_ladder.loaded:
+            married = await models.Claim.find_many(
+                models.Claim.user_id == user_id,
+                models.Claim.index != None,
+                models.Claim.state == WaifuState.ACTIVE,
+            ).count()
+            duel_ladder.update_married(user_id, married)
+
+    async def fetch_duel_neighbors(self, nyah_player: models.NyahPlayer, count: int = 2) -> List[tuple]:
+        """ Up to `count` duel-eligible players ranked directly above and below `nyah_player`.
+
+            Returns `(score, user_id)` pairs.
+        """
+        if not duel_ladder.loaded:
+            await self.load_duel_ladder()
+        return duel_ladder.neighbors(nyah_player.user_id, nyah_player.score, count)
+
+
+
+    async def reset_season(self) -> models.Season:
+        """ Archive the final standings, then reset every player and harem.
+
+            Both collections are reset with a single `bulk_write` inside one
+            transaction, so a failure leaves the previous season untouched.
+        """
+        start = time.perf_counter()
+        nyah_config = await models.nyah_config_cache.get()
+        timestamp_end = disnake.utils.utcnow()
+        players = models.NyahPlayer.get_motor_collection()
+        claims = models.Claim.get_motor_collection()
+
+        try:
+            async with await players.database.client.start_session() as session:
+                async with session.start_transaction():
+                    standings = await players.find(
+                        {},
+                        projection={"user_id": True, "name": True, "score": True, "level": True},
+                        sort=[("score", pymongo.DESCENDING)],
+                        session=session,
+                    ).to_list(None)
+                    player_result = await players.bulk_write([
+                        pymongo.UpdateMany({}, {"$set": {
+                            "score": 100,
+                            "level": 0,
+                            "xp": 0,
+                            "money": 0,
+                            "wishlist": [],
+                            "timestamp_last_claim": None,
+                            "timestamp_last_duel": None,
+                            "timestamp_last_minigame": None,
+                        }}),
+                    ], session=session)
+                    claim_result = await claims.bulk_write([
+                        pymongo.UpdateMany({}, {"$set": {"state": WaifuState.INACTIVE.value, "index": None}}),
+                    ], session=session)
+
+                    season = models.Season(
+                        timestamp_start=nyah_config.timestamp_last_season_end,
+                        timestamp_end=timestamp_end,
+                        standings=[
+                            models.SeasonStanding(
+                                user_id=player["user_id"],
+                                name=player["name"],
+                                score=player["score"],
+                                level=player["level"],
+                            ) for player in standings
+                        ],
+                        players_reset=player_result.modified_count,
+                        claims_reset=claim_result.modified_count,
+                    )
+                    await season.insert(session=session)
+
+                    nyah_config.timestamp_last_season_end = timestamp_end
+                    await nyah_config.save(session=session)
+        except Exception:
+            models.nyah_config_cache.invalidate()
+            raise
+
+        await self.load_duel_ladder()
+        logger.info(f"Season reset in {time.perf_counter() - start:.2f}s: "
+                    f"{season.players_reset:,} players and {season.claims_reset:,} claims reset, "
+                    f"{len(season.standings):,} standings archived")
+        return season
+
+    async def fetch_last_season(self) -> models.Season | None:
+        result = await models.Season.find_all().sort(
+            [(models.Season.timestamp_end, pymongo.DESCENDING)]
+        ).limit(1).to_list()
+        return result[0] if result else None
 
 
 
@@ -181,8 +505,52 @@ class Mongo():
     async def insert_claim(self, claim: models.Claim) -> None:
         await claim.insert()
 
+    async def insert_harem_claim(self, claim: models.Claim) -> None:
+        """ Insert a new claim at the end of its owner's harem. """
+        async with models.harem_locks[claim.user_id]: # so two claims can't both take the next index
+            last = await models.Claim.get_motor_collection().find_one(
+                {"user_id": claim.user_id, "index": {"$ne": None}},
+                projection={"index": True},
+                sort=[("index", pymongo.DESCENDING)],
+            )
+            claim.index = last["index"] + 1 if last else 1
+            await claim.insert()
+
+    async def remove_from_harem(self, claim: models.Claim, state: WaifuState) -> bool:
+        """ Take a claim out of its owner's harem and close the gap it leaves.
+
+            Returns `False` if the claim had already left the harem.
+        """
+        collection = models.Claim.get_motor_collection()
+        async with models.harem_locks[claim.user_id]:
+            result = await collection.find_one_and_update(
+                {"_id": bson.Binary.from_uuid(claim.id), "index": {"$ne": None}},
+                {"$set": {"state": state.value, "index": None}},
+                projection={"index": True},
+                return_document=pymongo.ReturnDocument.BEFORE,
+            )
+            claim.state = state
+            claim.index = None
+            if not result:
+                return False
+            
+            await collection.update_many(
+                {"user_id": claim.user_id, "index": {"$gt": result["index"]}},
+                {"$inc": {"index": -1}},
+            )
+        await self.refresh_duel_ladder_marriages(claim.user_id)
+        return True
+
     async def update_claim(self, claim: models.Claim) -> None:
-        await claim.save()
+        # the harem index is only moved by insert_harem_claim/remove_from_harem/reindex,
+        # so never write back a possibly stale copy of it
+        previous = await models.Claim.find_one(models.Claim.id == claim.id).update(
+            Set(claim.model_dump(exclude={"id", "index", "revision_id"})),
+            response_type=UpdateResponse.OLD_DOCUMENT,
+        )
+        # only a marriage or divorce changes the married count
+        if previous and previous.state != claim.state:
+            await self.refresh_duel_ladder_marriages(claim.user_id)
 
     async def fetch_claim(self, uuid: uuid.UUID) -> models.Claim | None:
         return await models.Claim.find_one(models.Claim.id == uuid)
@@ -202,8 +570,27 @@ class Mongo():
             models.Claim.slug == slug
         ).to_list()
 
+    async def fetch_claim_counts_by_slug(self, user: disnake.Member | disnake.User, slugs: List[str]) -> Dict[str, int]:
+        """ How many times the user has claimed each of `slugs`, in one aggregation.
+
+            Slugs the user never claimed are left out of the result.
+        """
+        pipeline = [
+            {"$match": {
+                "user_id": user.id,
+                "slug": {"$in": list(set(slugs))},
+            }},
+            {"$group": {
+                "_id": "$slug",
+                "count": {"$sum": 1}
+            }}
+        ]
+        result = await models.Claim.get_motor_collection().aggregate(pipeline).to_list(None)
+        return {group["_id"]: group["count"] for group in result}
+
     async def update_all_claims(self, field: str, value: Any) -> None:
         await models.Claim.find_all().update(Set({field: value}))
+        duel_ladder.invalidate()
 
 
     async def fetch_harem_count(self, user: disnake.Member | disnake.User) -> int:
@@ -236,6 +623,29 @@ class Mongo():
             models.Claim.state == WaifuState.COOLDOWN,
         ).count()
     
+    async def fetch_harem_summary(self, user: Union[disnake.Member, disnake.User, models.NyahPlayer]) -> models.HaremSummary:
+        user_id = user.id if isinstance(user, (disnake.Member, disnake.User)) else user.user_id
+        pipeline = [
+            {"$match": {
+                "user_id": user_id,
+                "index": {"$ne": None},
+                "state": {"$nin": [WaifuState.NULL.value, WaifuState.SOLD.value, WaifuState.FUSED.value]},
+            }},
+            {"$group": {
+                "_id": {"state": "$state", "tier": "$tier"},
+                "count": {"$sum": 1}
+            }}
+        ]
+        result = await models.Claim.get_motor_collection().aggregate(pipeline).to_list(None)
+
+        summary = models.HaremSummary()
+        for group in result:
+            state = WaifuState(group["_id"]["state"])
+            tier = Tiers(group["_id"]["tier"])
+            summary.states[state] = summary.states.get(state, 0) + group["count"]
+            summary.tiers[tier] = summary.tiers.get(tier, 0) + group["count"]
+        return summary
+
     async def fetch_harem(self, user: disnake.Member | disnake.User) -> models.Harem:
         result = await models.Claim.find_many(
             models.Claim.user_id == user.id,
@@ -257,13 +667,38 @@ class Mongo():
         ).to_list()
         return models.Harem(result)
     
+    async def fetch_harem_summaries(
+        self,
+        user: disnake.Member | disnake.User,
+        married: bool = False,
+        trusted: bool = False
+    ) -> List[models.ClaimSummary]:
+        """ Harem (or married harem) as `ClaimSummary` projections, ordered by index.
+
+            `trusted` skips pydantic validation and builds the summaries from
+            the raw documents, for display-only reads.
+        """
+        query = {"user_id": user.id, "index": {"$ne": None}}
+        if married:
+            query["state"] = WaifuState.ACTIVE.value
+        else:
+            query["state"] = {"$nin": [WaifuState.NULL.value, WaifuState.SOLD.value, WaifuState.FUSED.value]}
+
+        if trusted:
+            projection = {field.alias or name: True for name, field in models.ClaimSummary.model_fields.items()}
+            cursor = models.Claim.get_motor_collection().find(query, projection).sort("index", pymongo.ASCENDING)
+            return [models.ClaimSummary.from_raw(document) async for document in cursor]
+
+        return await models.Claim.find_many(query).sort(
+            [(models.Claim.index, pymongo.ASCENDING)]
+        ).project(models.ClaimSummary).to_list()
+
     async def fetch_random_harem_married(self, user: disnake.Member | disnake.User) -> models.Claim:
         pipeline = [
             {"$match": {
                 "user_id": user.id,
                 "index": {"$ne": None},
-                "state": {"$ne": None},
-                "state": WaifuState.ACTIVE,
+                "state": WaifuState.ACTIVE.value,
             }},
             {"$sample": {"size": 1}}
         ]
@@ -278,14 +713,45 @@ class Mongo():
     async def fetch_active_war(self, guild: disnake.Guild) -> models.Event | None:
         return await models.Event.find_one(
             models.Event.guild_id == guild.id,
-            models.Event.state == disnake.GuildScheduledEventStatus.scheduled.value,
+            models.Event.state == disnake.GuildScheduledEventStatus.active.value,
+        )
+
+    async def fetch_versus_image_url(self, key: str, max_age: datetime.timedelta) -> str | None:
+        """ The hosted URL of a versus image, if it was uploaded less than `max_age` ago. """
+        versus_image = await models.VersusImage.find_one(models.VersusImage.key == key)
+        if not versus_image or disnake.utils.utcnow() - versus_image.timestamp > max_age:
+            return None
+        return versus_image.url
+
+    async def upsert_versus_image(self, key: str, url: str) -> None:
+        await models.VersusImage.get_motor_collection().update_one(
+            {"key": key},
+            {
+                "$set": {
+                    "url": url,
+                    "timestamp": str(disnake.utils.utcnow()), # matches the model's datetime encoder
+                },
+                "$setOnInsert": {"_id": bson.Binary.from_uuid(uuid.uuid4())},
+            },
+            upsert=True,
         )
 
     async def insert_vote(self, vote: models.Vote) -> None:
         await vote.insert()
 
-    async def fetch_and_delete_vote(self, user: disnake.Member | disnake.User, battle_id: uuid.UUID) -> None:
-        await models.Vote.find_one(
-            models.Vote.user_id == user.id,
-            models.Vote.battle_id == battle_id
-        ).delete()
+    async def upsert_vote(self, user: disnake.Member | disnake.User, battle_id: uuid.UUID, waifu_vote_id: uuid.UUID) -> None:
+        """ Record or change a user's vote in a battle with one write.
+
+            The unique `(battle_id, user_id)` index keeps it to one vote per user.
+        """
+        await models.Vote.get_motor_collection().update_one(
+            {"battle_id": bson.Binary.from_uuid(battle_id), "user_id": user.id},
+            {
+                "$set": {
+                    "waifu_vote_id": bson.Binary.from_uuid(waifu_vote_id),
+                    "timestamp": str(disnake.utils.utcnow()), # matches the model's datetime encoder
+                },
+                "$setOnInsert": {"_id": bson.Binary.from_uuid(uuid.uuid4())},
+            },
+            upsert=True,
+        )
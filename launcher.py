@@ -20,6 +20,9 @@ async def main():
         DISCORD_BOT_TOKEN=os.environ["DISCORD_BOT_TOKEN"],
         DATABASE_URI=os.environ["DATABASE_URI"],
         MAL_CLIENT_ID=os.environ["MAL_CLIENT_ID"],
+        IMAGE_WORKERS=int(os.environ["IMAGE_WORKERS"]) if os.environ.get("IMAGE_WORKERS") else None,
+        IMAGE_MAX_BYTES=int(os.environ["IMAGE_MAX_BYTES"]) if os.environ.get("IMAGE_MAX_BYTES") else 10 * 1024**2,
+        AUTO_SEASON_END=os.environ.get("AUTO_SEASON_END") in ("1", "True", "true"),
     )
 
     # Create logger
@@ -45,4 +48,6 @@ async def main():
     await bot.start(config.DISCORD_BOT_TOKEN)
 
 
-asyncio.run(main())
+# worker processes re-import this module, so only start the bot from the main process
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,3 +1,3 @@
-from .characters import Waifu, Claim, Harem
-from .nyah import NyahPlayer, NyahGuild, NyahConfig
-from .wars import Vote, Battle, Match, Round, Event
\ No newline at end of file
+from .characters import Waifu, Claim, ClaimSummary, Harem, HaremSummary, harem_locks
+from .nyah import NyahPlayer, NyahGuild, NyahConfig, Season, SeasonStanding, nyah_config_cache, PlayerUnitOfWork, current_unit_of_work
+from .wars import Vote, Battle, Match, Round, Event, VersusImage
\ No newline at end of file
@@ -1,22 +1,36 @@
 import random
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 from uuid import UUID, uuid4
 from importlib import import_module
 
-from pydantic import Field
+import bson
+import pymongo
+from pymongo import UpdateOne
+from pydantic import BaseModel, Field
 from beanie import Document
-from beanie.operators import Set
-from beanie.odm.bulk import BulkWriter
 
 from utils.traits import TraitTypes
 from utils.constants import Emojis, WaifuState, Tiers, TIER_PAYOUT_MAP
 
+# user id -> lock held while that user's harem indexes are read and moved.
+# A unique (user_id, index) index can't guard this, because closing a gap
+# shifts many indexes with one update_many and would collide mid-way.
+harem_locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+
 class Waifu(Document):
     class Settings:
         name = "core"
         indexes = [
             "slug",
+            "name",
+            "popularity_rank",
+            pymongo.IndexModel([("birthday_month", pymongo.ASCENDING), ("birthday_day", pymongo.ASCENDING), ("name", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("series", pymongo.ASCENDING), ("name", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("tags", pymongo.ASCENDING), ("name", pymongo.ASCENDING)]),
         ]
     
     id: UUID = Field(default_factory=uuid4)
@@ -60,8 +74,10 @@ class Claim(Document):
         name = "claims"
         indexes = [
             "slug",
-            "user_id",
             "guild_id",
+            pymongo.IndexModel([("user_id", pymongo.ASCENDING), ("index", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("user_id", pymongo.ASCENDING), ("state", pymongo.ASCENDING), ("index", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("user_id", pymongo.ASCENDING), ("slug", pymongo.ASCENDING)]),
         ]
         bson_encoders = {
             datetime: str
@@ -158,16 +174,94 @@ class Claim(Document):
         return f"{health_bar} [{self.health_points}/{self.health}]"
 
 
+class ClaimSummary(BaseModel):
+    """ The subset of `Claim` that harem lists and autocompletes display. """
+    id: UUID = Field(alias="_id")
+    slug: str
+    name: str
+    image_url: str
+    state: WaifuState = Field(None)
+    index: Optional[int] = None
+    tier: Tiers
+    attack: Optional[int] = None
+    health: Optional[int] = None
+    speed: Optional[int] = None
+
+    @classmethod
+    def from_raw(cls, document: dict) -> "ClaimSummary":
+        """ Build from a raw `claims` document without validating it.
+
+            Only for documents read straight from our own collection.
+        """
+        _id = document["_id"]
+        return cls.model_construct(
+            id=_id if isinstance(_id, UUID) else UUID(bytes=_id),
+            slug=document["slug"],
+            name=document["name"],
+            image_url=document["image_url"],
+            state=WaifuState(document.get("state")),
+            index=document.get("index"),
+            tier=Tiers(document["tier"]),
+            attack=document.get("attack"),
+            health=document.get("health"),
+            speed=document.get("speed"),
+        )
+
+    @property
+    def total_skill_points(self) -> int:
+        return self.attack + self.health + self.speed
+    
+    @property
+    def skill_str_short(self) -> str:
+        return f"{Emojis.SKILL_TOTAL} {(self.total_skill_points / 450) * 100:.1f}%"
+
+
 class Harem(List[Claim]):
     def __init__(self, claims: List[Claim]) -> None:
         super().__init__(claims)
     
     async def reindex(self) -> None:
-        async with BulkWriter() as bulk_writer:
+        if not self:
+            return
+        async with harem_locks[self[0].user_id]:
+            requests = []
             for index, claim in enumerate(self, 1):
                 if claim.index != index:
-                    await Claim.find_one(
-                        Claim.id == claim.id
-                    ).update_one(
-                        Set({Claim.index: index}), bulk_writer=bulk_writer
-                    )
+                    requests.append(UpdateOne({"_id": bson.Binary.from_uuid(claim.id)}, {"$set": {"index": index}}))
+                    claim.index = index
+            if requests:
+                await Claim.get_motor_collection().bulk_write(requests, ordered=False)
+
+    def discard(self, claim: Claim) -> None:
+        """ Drop a claim that left the harem and shift the indexes above it,
+            mirroring `Mongo.remove_from_harem` without re-reading the harem.
+        """
+        for i, harem_claim in enumerate(self):
+            if harem_claim.id == claim.id:
+                del self[i]
+                break
+        for index, harem_claim in enumerate(self, 1):
+            harem_claim.index = index
+
+
+@dataclass
+class HaremSummary():
+    """ Per-state and per-tier claim counts for one user's harem. """
+    states: Dict[WaifuState, int] = field(default_factory=dict)
+    tiers: Dict[Tiers, int] = field(default_factory=dict)
+
+    @property
+    def total(self) -> int:
+        return sum(self.states.values())
+
+    @property
+    def married(self) -> int:
+        return self.states.get(WaifuState.ACTIVE, 0)
+
+    @property
+    def unmarried(self) -> int:
+        return self.states.get(WaifuState.INACTIVE, 0)
+
+    @property
+    def cooldown(self) -> int:
+        return self.states.get(WaifuState.COOLDOWN, 0)
@@ -1,16 +1,17 @@
 import random
+from contextvars import ContextVar
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Optional, List, Dict
 from uuid import UUID, uuid4
 
 import disnake
+import pymongo
 from beanie import Document
-from beanie.operators import NotIn
 from pydantic import BaseModel, Field
 
 import utils
 from models import Waifu, Claim
-from utils.constants import Emojis, WaifuState, Cooldowns, Prices, ItemTypes, TIER_PAYOUT_MAP
+from utils.constants import WaifuState, Cooldowns, ItemTypes
 
 
 cooldown_attribute_map = {
@@ -49,6 +50,39 @@ class NyahConfig(Document):
     timestamp_last_season_end: datetime
 
 
+class NyahConfigCache():
+    """ Process-wide copy of the `NyahConfig` document.
+
+        Loaded once at startup and replaced whenever the config is written,
+        so the hot path never has to read the config collection.
+    """
+    def __init__(self) -> None:
+        self.config: NyahConfig | None = None
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self) -> NyahConfig:
+        self.misses += 1
+        result = await NyahConfig.find().limit(1).to_list()
+        self.config = result[0]
+        return self.config
+
+    async def get(self) -> NyahConfig:
+        if self.config is None:
+            return await self.load()
+        self.hits += 1
+        return self.config
+
+    def set(self, config: NyahConfig) -> None:
+        self.config = config
+
+    def invalidate(self) -> None:
+        self.config = None
+
+
+nyah_config_cache = NyahConfigCache()
+
+
 class NyahGuild(Document):
     class Settings:
         name = "guilds"
@@ -72,10 +106,12 @@ class NyahPlayer(Document):
         name = "players"
         indexes = [
             "user_id",
+            pymongo.IndexModel([("score", pymongo.DESCENDING)]),
         ]
         bson_encoders = {
             datetime: str
         }
+        use_state_management = True
     
     id: UUID = Field(default_factory=uuid4)
     user_id: int
@@ -96,14 +132,21 @@ class NyahPlayer(Document):
     timestamp_last_claim: Optional[datetime] = None
     timestamp_last_minigame: Optional[datetime] = None
 
-    async def generate_claim(self, waifu: Waifu) -> Claim:
-        harem_size = await Claim.find_many(
-            Claim.user_id == self.user_id,
-            Claim.index != None,
-            Claim.state != None,
-            NotIn(Claim.state, [WaifuState.NULL, WaifuState.SOLD, WaifuState.FUSED]),
-        ).count() # using query instead of fetch_harem_count() to avoid circular import
+    async def commit(self, flush: bool = False) -> None:
+        """ Persist this player.
 
+            Inside an interaction the write is deferred to the unit of work,
+            which flushes every changed field once the command finishes.
+            Pass `flush` to write the pending changes immediately.
+        """
+        unit_of_work = current_unit_of_work.get()
+        if unit_of_work and unit_of_work.tracks(self):
+            if flush:
+                await unit_of_work.flush(self)
+            return
+        await self.save()
+
+    async def generate_claim(self, waifu: Waifu) -> Claim:
         total_characters = await Waifu.count()
         
         claim = Claim(
@@ -113,7 +156,7 @@ class NyahPlayer(Document):
             image_url=waifu.image_url,
             cached_images_urls=[],
             state=WaifuState.INACTIVE,
-            index=harem_size + 1,
+            index=None, # assigned by Mongo.insert_harem_claim
             tier=utils.tier_from_rank(total_characters, waifu.popularity_rank),
         )
 
@@ -122,66 +165,24 @@ class NyahPlayer(Document):
         
         return claim
 
-    async def add_user_xp(self, xp: int, user: disnake.Member | disnake.User = None, channel: disnake.TextChannel = None) -> None:
-        self.xp += xp
-
-        # check if they leveled up
-        if self.xp >= utils.calculate_accumulated_xp(self.level + 1):
-            self.level += 1
-            self.money += Prices.PAYOUT_LEVEL_UP.value
-            if channel and user:
-                level_up_embed = disnake.Embed(
-                    description=f"### ㊗️ Congratulations {user.mention}! You are now level {self.level}!\n\n"
-                                f"You have been awarded `{Prices.PAYOUT_LEVEL_UP.value:,}` {Emojis.COINS}",
-                    color=disnake.Color.dark_teal()
-                ).set_thumbnail(url=user.avatar.url)
-                await channel.send(embed=level_up_embed)
-        
-        await self.save()
+    def apply_atomic_update(self, document: dict) -> None:
+        """ Copy fields returned by a server-side update onto this instance.
 
-    async def add_user_mmr(self, mmr: int) -> None:
-        if self.score + mmr <= 100:
-            self.score = 100
-        else:
-            self.score += mmr
-        await self.save()
-
-    async def add_user_money(self, money: int) -> None:
-        if self.money + money <= 0:
-            self.money = 0
-        else:
-            self.money += money
-        await self.save()
-    
-    async def add_inventory_item(self, item_type: ItemTypes, item_amount: int) -> None:
-        for i in self.inventory:
-            if i.type == item_type:
-                i.amount += item_amount
-                break
-        else:
-            self.inventory.append(InventoryItem(type=item_type, amount=item_amount))
-
-        await self.save()
-    
-    async def remove_inventory_item(self, item_type: ItemTypes, item_amount: int) -> None:
-        for i in self.inventory:
-            if i.type == item_type:
-                i.amount -= item_amount
-                break
-        else:
-            raise ValueError(f"User {self.user_id} does not have item {item_type} in their inventory")
-
-        await self.save()
-
-    async def sell_waifu(self, claim: Claim) -> None:
-        claim.state = WaifuState.SOLD
-        claim.index = None
-        await claim.save()
-        await self.add_user_money(TIER_PAYOUT_MAP[claim.tier].value)
+            The fields are also recorded as saved, so a later `commit` does
+            not overwrite the atomic result with a stale full value.
+        """
+        for field, value in document.items():
+            if field == "_id":
+                continue
+            if field == "inventory":
+                setattr(self, field, [InventoryItem(**item) for item in value])
+            else:
+                setattr(self, field, value)
+            if self._saved_state is not None:
+                self._saved_state[field] = value
 
     async def user_is_on_cooldown(self, cooldown_type: Cooldowns) -> bool:
-        result = await NyahConfig.find().limit(1).to_list() # using query instead of fetch_nyah_config() to avoid circular import
-        nyah_config = result[0]
+        nyah_config = await nyah_config_cache.get()
         
         interval: int = getattr(nyah_config, cooldown_attribute_map[cooldown_type]["interval"])
         timestamp: datetime = getattr(self, cooldown_attribute_map[cooldown_type]["timestamp"])
@@ -196,8 +197,7 @@ class NyahPlayer(Document):
         return True # user is on cooldown
 
     async def user_cooldown_expiration_time(self, cooldown_type: Cooldowns) -> datetime:
-        result = await NyahConfig.find().limit(1).to_list() # using query instead of fetch_nyah_config() to avoid circular import
-        nyah_config = result[0]
+        nyah_config = await nyah_config_cache.get()
 
         interval: int = getattr(nyah_config, cooldown_attribute_map[cooldown_type]["interval"])
         timestamp: datetime = getattr(self, cooldown_attribute_map[cooldown_type]["timestamp"])
@@ -206,4 +206,71 @@ class NyahPlayer(Document):
 
     async def reset_cooldown(self, cooldown_type: Cooldowns) -> None:
         setattr(self, cooldown_attribute_map[cooldown_type]["timestamp"], None)
-        await self.save()
+        await self.commit()
+
+
+class SeasonStanding(BaseModel):
+    user_id: int
+    name: str
+    score: int
+    level: int
+
+
+class Season(Document):
+    class Settings:
+        name = "seasons"
+        indexes = [
+            pymongo.IndexModel([("timestamp_end", pymongo.DESCENDING)]),
+        ]
+        bson_encoders = {
+            datetime: str
+        }
+
+    id: UUID = Field(default_factory=uuid4)
+
+    timestamp_start: datetime
+    timestamp_end: datetime
+
+    standings: List[SeasonStanding] # final standings, highest score first
+    players_reset: int = 0
+    claims_reset: int = 0
+
+
+class PlayerUnitOfWork():
+    """ Identity map of the `NyahPlayer` documents touched by one interaction.
+
+        Each player is read at most once, and `commit` writes only the fields
+        that changed since it was loaded.
+    """
+    def __init__(self) -> None:
+        self.players: Dict[int, NyahPlayer] = {}
+        self.closed = False
+        self.reads = 0
+        self.writes = 0
+
+    def tracks(self, nyah_player: NyahPlayer) -> bool:
+        return not self.closed and self.players.get(nyah_player.user_id) is nyah_player
+
+    async def get(self, user_id: int) -> NyahPlayer | None:
+        if self.closed:
+            return await NyahPlayer.find_one(NyahPlayer.user_id == user_id)
+        if user_id not in self.players:
+            self.reads += 1
+            nyah_player = await NyahPlayer.find_one(NyahPlayer.user_id == user_id)
+            if nyah_player is None:
+                return None
+            self.players[user_id] = nyah_player
+        return self.players[user_id]
+
+    async def flush(self, nyah_player: NyahPlayer) -> None:
+        if nyah_player.is_changed:
+            self.writes += 1
+            await nyah_player.save_changes()
+
+    async def commit(self) -> None:
+        self.closed = True
+        for nyah_player in self.players.values():
+            await self.flush(nyah_player)
+
+
+current_unit_of_work: ContextVar[PlayerUnitOfWork | None] = ContextVar("current_unit_of_work", default=None)
@@ -2,6 +2,7 @@ from datetime import datetime
 from typing import Optional
 from uuid import UUID, uuid4
 
+import pymongo
 from beanie import Document
 from pydantic import Field
 
@@ -9,6 +10,10 @@ from pydantic import Field
 class Vote(Document):
     class Settings:
         name = "votes"
+        indexes = [
+            pymongo.IndexModel([("battle_id", pymongo.ASCENDING), ("waifu_vote_id", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("battle_id", pymongo.ASCENDING), ("user_id", pymongo.ASCENDING)], unique=True),
+        ]
         bson_encoders = {
             datetime: str
         }
@@ -25,6 +30,9 @@ class Vote(Document):
 class Battle(Document):
     class Settings:
         name = "battles"
+        indexes = [
+            pymongo.IndexModel([("match_id", pymongo.ASCENDING), ("number", pymongo.ASCENDING)]),
+        ]
         bson_encoders = {
             datetime: str
         }
@@ -44,6 +52,9 @@ class Battle(Document):
 class Match(Document):
     class Settings:
         name = "matches"
+        indexes = [
+            pymongo.IndexModel([("round_id", pymongo.ASCENDING), ("number", pymongo.ASCENDING)]),
+        ]
         bson_encoders = {
             datetime: str
         }
@@ -51,8 +62,8 @@ class Match(Document):
     id: UUID = Field(default_factory=uuid4)
     round_id: UUID = Field(default_factory=uuid4)
     # discord uuid's
-    user_red_id: int
-    user_blue_id: int
+    user_red_id: Optional[int] = None # empty until the previous round is decided
+    user_blue_id: Optional[int] = None
     winner_id: Optional[int] = None
     # other
     number: int
@@ -63,6 +74,9 @@ class Match(Document):
 class Round(Document):
     class Settings:
         name = "rounds"
+        indexes = [
+            pymongo.IndexModel([("war_id", pymongo.ASCENDING), ("number", pymongo.ASCENDING)]),
+        ]
         bson_encoders = {
             datetime: str
         }
@@ -80,6 +94,9 @@ class Round(Document):
 class Event(Document):
     class Settings:
         name = "events"
+        indexes = [
+            pymongo.IndexModel([("guild_id", pymongo.ASCENDING), ("state", pymongo.ASCENDING)]),
+        ]
         bson_encoders = {
             datetime: str
         }
@@ -92,3 +109,20 @@ class Event(Document):
     state: int # disnake.GuildScheduledEventStatus
     timestamp_start: Optional[datetime] = None
     timestamp_end: Optional[datetime] = None
+
+
+class VersusImage(Document):
+    class Settings:
+        name = "versus_images"
+        indexes = [
+            pymongo.IndexModel([("key", pymongo.ASCENDING)], unique=True),
+        ]
+        bson_encoders = {
+            datetime: str
+        }
+
+    id: UUID = Field(default_factory=uuid4)
+    key: str # hash of both claim ids and their image URLs
+    # other
+    url: str
+    timestamp: datetime
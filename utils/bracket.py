@@ -1,50 +1,192 @@
 import math
 import uuid
 import random
+import asyncio
 import datetime
-from typing import List, Optional
+from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass
 
+import disnake
+import pymongo
+import pymongo.errors
+from beanie import Document
+from bson import Binary
+from beanie.operators import Set, In
+from loguru import logger
 
 from models import (
     Claim,
+    Event,
+    Vote,
     Battle,
     Match,
     Round,
 )
 
+BYE = 0 # user id of the empty slot that pads the first round
+
+
 @dataclass(kw_only=True)
 class BracketTeam():
-    user_id: Optional[str] = None
+    user_id: Optional[int] = None
     name: Optional[str] = None
     ranking: Optional[int] = None
 
+class BracketWriter():
+    """ Write-behind queue for bracket documents.
+
+        Changes are applied to the in-memory bracket right away and written
+        in order by a single background task. Updates to a document that is
+        still waiting to be written are merged into its pending write. A
+        failed write is retried with a growing delay before it is given up.
+    """
+    WRITE_ATTEMPTS = 5
+
+    def __init__(self) -> None:
+        self.pending: Dict[uuid.UUID, Tuple[Document, Dict | None]] = {} # `None` fields means insert
+        self.queue: asyncio.Queue[uuid.UUID] = asyncio.Queue()
+        self.task: asyncio.Task | None = None
+        self.writes = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _enqueue(self, document: Document, fields: Dict | None) -> None:
+        if document.id in self.pending:
+            _, pending_fields = self.pending[document.id]
+            if pending_fields is not None and fields is not None:
+                pending_fields.update(fields)
+            # a pending insert writes the whole document, which already has the change
+        else:
+            self.pending[document.id] = (document, fields)
+            self.queue.put_nowait(document.id)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def insert(self, document: Document) -> None:
+        self._enqueue(document, None)
+
+    def set(self, document: Document, fields: Dict) -> None:
+        self._enqueue(document, dict(fields))
+
+    async def _write(self, document: Document, fields: Dict | None) -> None:
+        if fields is None:
+            try:
+                await document.insert()
+            except pymongo.errors.DuplicateKeyError:
+                pass # an earlier attempt went through without us hearing back
+        else:
+            # a query-level update leaves the in-memory document alone
+            model = type(document)
+            await model.find_one(model.id == document.id).update(Set(fields))
+
+    async def _run(self) -> None:
+        while True:
+            document_id = await self.queue.get()
+            document, fields = self.pending.pop(document_id)
+            try:
+                for attempt in range(1, self.WRITE_ATTEMPTS + 1):
+                    try:
+                        await self._write(document, fields)
+                        self.writes += 1
+                        break
+                    except Exception as e:
+                        if attempt == self.WRITE_ATTEMPTS:
+                            self.failures += 1
+                            logger.exception(f"Gave up writing {type(document).__name__} '{document.id}' after {attempt} attempts: {e}")
+                            break
+                        self.retries += 1
+                        logger.warning(f"Failed to write {type(document).__name__} '{document.id}', retrying: {e}")
+                        await asyncio.sleep(2 ** attempt)
+            finally:
+                self.queue.task_done()
+
+    async def flush(self) -> None:
+        """ Wait until every queued write has been applied. """
+        await self.queue.join()
+
+    async def close(self) -> None:
+        """ Apply every queued write, then stop the background task. """
+        await self.flush()
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
 class Bracket():
+    """ A war's bracket held as an in-memory tree of rounds, matches and battles.
+
+        Every lookup is answered from memory. Changes are applied to the tree
+        immediately and persisted through a `BracketWriter`, and `load`
+        rebuilds the tree from the database after a restart.
+    """
     def __init__(
         self,
-        war_id: str,
-        bracket: List[Round] = list(),
-        participants: List[BracketTeam] = list()
+        war: Event,
+        participants: List[BracketTeam] | None = None
     ):
-        self.war_id = war_id
-        self.bracket = bracket
-        self.participants = participants
+        self.war = war
+        self.war_id = war.id
+        self.participants = participants if participants is not None else []
         self.champion = None
-        
-        if self.bracket and self.participants:
-            self.num_teams = len(self.participants)
-            self.num_rounds = len(self.bracket)
-    
+
+        self.rounds: List[Round] = []
+        self.matches: Dict[uuid.UUID, List[Match]] = {} # round id -> matches in number order
+        self.battles: Dict[uuid.UUID, Battle] = {} # match id -> latest battle
+        self.ongoing: Dict[uuid.UUID, int] = {} # round id -> number of undecided matches
+        self.writer = BracketWriter()
+
     @classmethod
-    def from_data(
-        cls,
-        bracket: List[dict],
-        participants: List[dict]
-    ):
-        return cls(
-            bracket=Round.schema().load(bracket, many=True),
-            participants=BracketTeam.schema().load(participants, many=True)
-        )
+    async def load(cls, war: Event) -> "Bracket":
+        """ Rebuild the bracket of `war` with one query per collection. """
+        bracket = cls(war)
+        rounds = await Round.find_many(
+            Round.war_id == war.id
+        ).sort(
+            [(Round.number, pymongo.ASCENDING)]
+        ).to_list()
+        matches = await Match.find_many(
+            In(Match.round_id, [round.id for round in rounds])
+        ).sort(
+            [(Match.number, pymongo.ASCENDING)]
+        ).to_list()
+        battles = await Battle.find_many(
+            In(Battle.match_id, [match.id for match in matches])
+        ).sort(
+            [(Battle.number, pymongo.ASCENDING)]
+        ).to_list()
+        bracket.build(rounds, matches, battles)
+
+        if bracket.rounds:
+            for ranking, match in enumerate(bracket.matches[bracket.rounds[0].id], 1):
+                for user_id in (match.user_red_id, match.user_blue_id):
+                    bracket.participants.append(BracketTeam(user_id=user_id, ranking=ranking))
+        return bracket
+
+    def build(self, rounds: List[Round], matches: List[Match], battles: List[Battle]) -> None:
+        """ Index documents that are already sorted by number. """
+        self.rounds = sorted(rounds, key=lambda round: round.number)
+        self.matches = {round.id: [] for round in self.rounds}
+        for match in matches:
+            self.matches[match.round_id].append(match)
+        self.ongoing = {
+            round_id: sum(1 for match in round_matches if match.winner_id is None)
+            for round_id, round_matches in self.matches.items()
+        }
+        self.battles = {battle.match_id: battle for battle in battles}
+
+    async def flush(self) -> None:
+        await self.writer.flush()
+
+    async def close(self) -> None:
+        """ Persist every pending change and stop the writer once the war is over. """
+        await self.writer.close()
+
+    @property
+    def num_rounds(self) -> int:
+        return len(self.rounds)
 
     def __str__(self):
         """ Returns a string representation of the Bracket object. """
@@ -126,7 +268,7 @@ class Bracket():
 
         return bracket_str
     
-    def add_team(self, name: str, user_id: str, ranking: int):
+    def add_team(self, name: str, user_id: int, ranking: int):
         """ Adds a team to the tournament with the given name and ranking. """
         self.participants.append(
             BracketTeam(
@@ -136,8 +278,12 @@ class Bracket():
             )
         )
         
-    def create_bracket(self) -> None:
-        """ Creates the tournament bracket based on the list of teams. """
+    async def create_bracket(self) -> None:
+        """ Creates the tournament bracket based on the list of teams.
+
+            Every round and match is written with one `insert_many` per collection,
+            and awaited so that the bracket can always be rebuilt by `load`.
+        """
 
         def gen_num_first_round_teams(n: int) -> int:
             """ Generates the number of teams in the first round given the number of teams in the bracket.
@@ -166,30 +312,30 @@ class Bracket():
         self.participants.sort(key=lambda x: x.ranking)
 
         # get number of teams
-        self.num_teams = len(self.participants)
+        num_teams = len(self.participants)
 
         # number of rounds in the bracket (assuming a standard knockout tournament)
-        self.num_rounds = math.ceil(math.log(self.num_teams, 2))
+        num_rounds = math.ceil(math.log(num_teams, 2))
 
         # fill missing first-round teams with byes
-        num_byes = gen_num_first_round_teams(self.num_rounds) - self.num_teams
+        num_byes = gen_num_first_round_teams(num_rounds) - num_teams
         for _ in range(num_byes):
-            self.num_teams += 1
+            num_teams += 1
             self.participants.append(
                 BracketTeam(
-                    user_id="BYE",
+                    user_id=BYE,
                     name="BYE",
-                    ranking=self.num_teams,
+                    ranking=num_teams,
                 )
             )
 
         # generate all of the matches in the entire bracket
-        num_matches_in_round = self.num_teams // 2 
-        first_round_seed_order = gen_optimal_seed_order(self.num_rounds)
-        for round_num in range(self.num_rounds):
-            round_uuid = uuid.uuid4()
+        rounds: List[Round] = []
+        matches: List[Match] = []
+        num_matches_in_round = num_teams // 2 
+        first_round_seed_order = gen_optimal_seed_order(num_rounds)
+        for round_num in range(num_rounds):
             round = Round(
-                id=round_uuid,
                 war_id=self.war_id,
                 message_id=None,
                 number=round_num + 1,
@@ -197,13 +343,10 @@ class Bracket():
                 timestamp_end=None
             )
             for match_num in range(num_matches_in_round):
-                match_uuid = uuid.uuid4()
                 if round_num == 0:
                     # first round should have each match filled
-                    now = datetime.datetime.now(datetime.timezone.utc)
                     match = Match(
-                        id=match_uuid,
-                        round_id=round_uuid,
+                        round_id=round.id,
                         user_red_id=self.participants[first_round_seed_order[match_num * 2] - 1].user_id,
                         user_blue_id=self.participants[first_round_seed_order[match_num * 2 + 1] - 1].user_id,
                         winner_id=None,
@@ -211,12 +354,11 @@ class Bracket():
                         timestamp_start=None,
                         timestamp_end=None
                     )
-                    round.timestamp_start = now
+                    round.timestamp_start = datetime.datetime.now(datetime.timezone.utc)
                 else:
                     # latter rounds should be empty initially
                     match = Match(
-                        id=match_uuid,
-                        round_id=round_uuid,
+                        round_id=round.id,
                         user_red_id=None,
                         user_blue_id=None,
                         winner_id=None,
@@ -224,349 +366,221 @@ class Bracket():
                         timestamp_start=None,
                         timestamp_end=None
                     )
-                r.db("wars").table("matches").insert(match.__dict__).run(conn)
-            r.db("wars").table("rounds").insert(round.__dict__).run(conn)
+                matches.append(match)
             num_matches_in_round //= 2
-            self.bracket.append(round)
+            rounds.append(round)
+
+        await Round.insert_many(rounds)
+        await Match.insert_many(matches)
+        self.build(rounds, matches, [])
 
     #---------------------------------
     #          ROUND METHODS
     #---------------------------------
     
-    def get_round_message_id(self, round: Round) -> str | None:
-        return r.db("wars") \
-                .table("rounds") \
-                .get(round.id) \
-                .get_field("message_id") \
-                .run(conn)
+    def get_round_message_id(self, round: Round) -> int | None:
+        return round.message_id
     
-    def set_round_message_id(self, round: Round, message_id: str) -> None:
-        r.db("wars") \
-            .table("rounds") \
-            .get(round.id) \
-            .update({
-                "message_id": message_id
-            }) \
-            .run(conn)
+    def set_round_message_id(self, round: Round, message_id: int) -> None:
+        round.message_id = message_id
+        self.writer.set(round, {Round.message_id: message_id})
     
     def last_round(self, round: Round) -> bool:
-        next_round_num = round.number + 1
-        if next_round_num > self.get_num_rounds():
-            return True
-        return False
+        return round.number >= self.num_rounds
+
+    def get_round(self, number: int) -> Round | None:
+        if 0 < number <= self.num_rounds:
+            return self.rounds[number - 1]
+        return None
 
     def set_round_timestamp_end(self, round: Round) -> None:
-        round.timestamp_end = datetime.datetime.now(datetime.timezone.utc)
-        r.db("wars") \
-            .table("rounds") \
-            .get(round.id) \
-            .update(round.__dict__) \
-            .run(conn)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        round.timestamp_end = now
+        self.writer.set(round, {Round.timestamp_end: now})
         
         if self.last_round(round):
-            r.db("wars") \
-                .table("core") \
-                .get(self.war_id) \
-                .update({
-                    "timestamp_end": datetime.datetime.now(datetime.timezone.utc)
-                }) \
-                .run(conn)
+            self.war.timestamp_end = now
+            self.war.state = disnake.GuildScheduledEventStatus.completed.value
+            self.writer.set(self.war, {
+                Event.timestamp_end: now,
+                Event.state: self.war.state,
+            })
             return
 
-        next_round_num = round.number + 1
-        result = r.db("wars") \
-                    .table("rounds") \
-                    .filter(
-                        r.and_(
-                            r.row["war_id"].eq(self.war_id),
-                            r.row["number"].eq(next_round_num)
-                        )
-                    ) \
-                    .nth(0) \
-                    .run(conn)
-        next_round = Round(**result)
-        next_round.timestamp_start = datetime.datetime.now(datetime.timezone.utc)
-        r.db("wars") \
-            .table("rounds") \
-            .get(next_round.id) \
-            .update(next_round.__dict__) \
-            .run(conn)
+        next_round = self.get_round(round.number + 1)
+        next_round.timestamp_start = now
+        self.writer.set(next_round, {Round.timestamp_start: now})
 
     def start_round_matches(self, round: Round) -> None:
+        now = datetime.datetime.now(datetime.timezone.utc)
         if not round.timestamp_start:
-            round.timestamp_start = datetime.datetime.now(datetime.timezone.utc)
-            r.db("wars") \
-                .table("rounds") \
-                .get(round.id) \
-                .update(round.__dict__) \
-                .run(conn)
+            round.timestamp_start = now
+            self.writer.set(round, {Round.timestamp_start: now})
         
-        for match in self.get_round_matches(round):
-            match.timestamp_start = datetime.datetime.now(datetime.timezone.utc)
-            r.db("wars") \
-                .table("matches") \
-                .get(match.id) \
-                .update(match.__dict__) \
-                .run(conn)
-
-    def get_current_round(self) -> Round:
-        result = r.db("wars") \
-                    .table("rounds") \
-                    .filter(
-                        r.and_(
-                            r.row["war_id"].eq(self.war_id),
-                            r.row["timestamp_start"],
-                            r.not_(r.row["timestamp_end"])
-                        )
-                    ) \
-                    .order_by("number") \
-                    .nth(0) \
-                    .run(conn)
-        return Round(**result)
+        for match in self.matches[round.id]:
+            match.timestamp_start = now
+            self.writer.set(match, {Match.timestamp_start: now})
+
+    def get_current_round(self) -> Round | None:
+        for round in self.rounds:
+            if round.timestamp_start and not round.timestamp_end:
+                return round
+        return None
     
     def get_round_matches(self, round: Round) -> List[Match]:
-        result = r.db("wars") \
-                    .table("matches") \
-                    .filter(
-                        r.row["round_id"].eq(round.id),
-                    ) \
-                    .order_by("number") \
-                    .run(conn)
-        return [Match(**doc) for doc in result]
+        return list(self.matches[round.id])
     
     def round_has_bye(self, round: Round) -> bool:
-        return r.db("wars") \
-                .table("matches") \
-                .filter(
-                    r.and_(
-                        r.row["round_id"].eq(round.id),
-                        r.row["user_blue_id"].eq("BYE")
-                    )
-                ) \
-                .count() \
-                .gt(0) \
-                .run(conn)
+        return any(self.match_has_bye(match) for match in self.matches[round.id])
     
     def get_num_ongoing_matches(self, round: Round) -> int:
-        return r.db("wars") \
-                .table("matches") \
-                .filter(
-                    r.and_(
-                        r.row["round_id"].eq(round.id),
-                        r.not_(r.row["winner_id"])
-                    )
-                ) \
-                .count() \
-                .run(conn)
+        return self.ongoing[round.id]
 
     def get_num_rounds(self) -> int:
-        return r.db("wars") \
-                .table("rounds") \
-                .filter(
-                    r.row["war_id"].eq(self.war_id)
-                ) \
-                .count() \
-                .run(conn)
+        return self.num_rounds
     
-    def get_round_participant_ids(self, round: Round) -> List[str]:
+    def get_round_participant_ids(self, round: Round) -> List[int]:
         ids = []
-        for m in self.get_round_matches(round):
+        for m in self.matches[round.id]:
             ids.append(m.user_red_id)
-            if m.user_blue_id != "BYE":
+            if m.user_blue_id != BYE:
                 ids.append(m.user_blue_id)
         return ids
 
     def round_finished(self, round: Round) -> bool:
-        num_matches_in_round = len(self.get_round_matches(round))
-        return r.db("wars") \
-                    .table("matches") \
-                    .filter(
-                        r.row["round_id"].eq(round.id),
-                    ) \
-                    .has_fields("winner_id") \
-                    .count() \
-                    .eq(num_matches_in_round) \
-                    .run(conn)
+        return self.ongoing[round.id] == 0
 
     #---------------------------------
     #          MATCH METHODS
     #---------------------------------
     
     def match_has_bye(self, match: Match) -> bool:
-        return r.db("wars") \
-                .table("matches") \
-                .get(match.id) \
-                .get_field("user_blue_id") \
-                .eq("BYE") \
-                .run(conn)
-
-    def get_match_winner(self, match: Match) -> str | None:
-        return r.db("wars") \
-                .table("matches") \
-                .get(match.id) \
-                .get_field("winner_id") \
-                .run(conn)
-
-    def set_match_winner(self, match: Match, winner_id: str) -> None:
+        return match.user_blue_id == BYE
+
+    def get_match_winner(self, match: Match) -> int | None:
+        return match.winner_id
+
+    def set_match_winner(self, match: Match, winner_id: int) -> None:
+        if match.winner_id is None:
+            self.ongoing[match.round_id] -= 1
+
         # Update this match with the winner
         match.winner_id = winner_id
         match.timestamp_end = datetime.datetime.now(datetime.timezone.utc)
-        r.db("wars") \
-            .table("matches") \
-            .get(match.id) \
-            .update(match.__dict__) \
-            .run(conn)
+        self.writer.set(match, {
+            Match.winner_id: match.winner_id,
+            Match.timestamp_end: match.timestamp_end,
+        })
         
         # Get the next round and match
-        round = self.get_current_round()
+        round = next(round for round in self.rounds if round.id == match.round_id)
         next_round_num = round.number + 1
         next_match_num = match.number // 2 if match.number % 2 == 0 else (match.number + 1) // 2
 
         # Set the grand finals champion if we are in that round
-        self.num_rounds = self.get_num_rounds()
         if next_round_num > self.num_rounds:
-            self.champion = self.get_match_winner(match)
+            self.champion = winner_id
             return
 
-        result = r.db("wars") \
-                    .table("rounds") \
-                    .filter(
-                        r.and_(
-                            r.row["war_id"].eq(self.war_id),
-                            r.row["number"].eq(next_round_num)
-                        )
-                    ) \
-                    .nth(0) \
-                    .run(conn)
-        next_round = Round(**result)
-
-        result = r.db("wars") \
-                    .table("matches") \
-                    .filter(
-                        r.and_(
-                            r.row["round_id"].eq(next_round.id),
-                            r.row["number"].eq(next_match_num)
-                        )
-                    ) \
-                    .nth(0) \
-                    .run(conn)
-        next_match = Match(**result)
+        next_round = self.get_round(next_round_num)
+        next_match = self.matches[next_round.id][next_match_num - 1]
 
         # Update the next match with the winner of this one
-        has_red_user = r.db("wars") \
-                        .table("matches") \
-                        .get(next_match.id) \
-                        .has_fields("user_red_id") \
-                        .run(conn)
-        if not has_red_user:
-            r.db("wars") \
-                .table("matches") \
-                .get(next_match.id) \
-                .update({
-                    "user_red_id": winner_id
-                }) \
-                .run(conn)
+        if next_match.user_red_id is None:
+            next_match.user_red_id = winner_id
+            self.writer.set(next_match, {Match.user_red_id: winner_id})
         else:
-            r.db("wars") \
-                .table("matches") \
-                .get(next_match.id) \
-                .update({
-                    "user_blue_id": winner_id
-                }) \
-                .run(conn)
+            next_match.user_blue_id = winner_id
+            self.writer.set(next_match, {Match.user_blue_id: winner_id})
         
     #---------------------------------
     #         BATTLE METHODS
     #---------------------------------
 
-    def get_battle_message_id(self, battle: Battle) -> str | None:
-        return r.db("wars") \
-                .table("battles") \
-                .get(battle.id) \
-                .get_field("message_id") \
-                .run(conn)
-
-    def set_battle_message_id(self, battle: Battle, message_id: str) -> None:
-        r.db("wars") \
-            .table("battles") \
-            .get(battle.id) \
-            .update({
-                "message_id": message_id
-            }) \
-            .run(conn)
+    def get_battle_message_id(self, battle: Battle) -> int | None:
+        return battle.message_id
+
+    def set_battle_message_id(self, battle: Battle, message_id: int) -> None:
+        battle.message_id = message_id
+        self.writer.set(battle, {Battle.message_id: message_id})
 
     def get_current_battle(self, match: Match) -> Battle | None:
-        match_has_battles = r.db("wars") \
-                                .table("battles") \
-                                .filter(
-                                    r.row["match_id"].eq(match.id)
-                                ) \
-                                .count() \
-                                .gt(0) \
-                                .run(conn)
-        if not match_has_battles:
-            return None
-        
-        result = r.db("wars") \
-                    .table("battles") \
-                    .filter(
-                        r.row["match_id"].eq(match.id)
-                    ) \
-                    .order_by(r.desc("number")) \
-                    .nth(0) \
-                    .run(conn)
-        return Battle(**result)
+        return self.battles.get(match.id)
 
     def create_battle(self, match: Match, red_waifu: Claim, blue_waifu: Claim) -> Battle:
+        now = datetime.datetime.now(datetime.timezone.utc)
         current_battle = self.get_current_battle(match)
         if not current_battle:
             next_battle_num = 1
         else:
             next_battle_num = current_battle.number + 1
-            current_battle.timestamp_end = datetime.datetime.now(datetime.timezone.utc)
-            r.db("wars") \
-                .table("battles") \
-                .get(current_battle.id) \
-                .update(current_battle.__dict__) \
-                .run(conn)
+            current_battle.timestamp_end = now
+            self.writer.set(current_battle, {Battle.timestamp_end: now})
         
         battle = Battle(
-            id=r.uuid().run(conn),
             match_id=match.id,
             waifu_red_id=red_waifu.id,
             waifu_blue_id=blue_waifu.id,
             message_id=None,
             number=next_battle_num,
-            timestamp_start=datetime.datetime.now(datetime.timezone.utc),
+            timestamp_start=now,
             timestamp_end=None
         )
-        r.db("wars").table("battles").insert(battle.__dict__).run(conn)
+        self.battles[match.id] = battle
+        self.writer.insert(battle)
         return battle
 
-    def count_battle_votes(self, battle: Battle) -> dict:
-        # Count the votes
-        red_votes = r.db("wars") \
-                        .table("votes") \
-                        .filter(
-                            r.and_(
-                                r.row["battle_id"].eq(battle.id),
-                                r.row["waifu_vote_id"].eq(battle.waifu_red_id)
-                            )
-                        ) \
-                        .count() \
-                        .run(conn)
-        blue_votes = r.db("wars") \
-                        .table("votes") \
-                        .filter(
-                            r.and_(
-                                r.row["battle_id"].eq(battle.id),
-                                r.row["waifu_vote_id"].eq(battle.waifu_blue_id)
-                            )
-                        ) \
-                        .count() \
-                        .run(conn)
-        
+    async def count_round_votes(self, round: Round) -> Dict[uuid.UUID, dict]:
+        """ Tally the current battle of every undecided match in `round` with one aggregation.
+
+            Returns
+            -------
+            Dict[`uuid.UUID`, `dict`]
+                The `count_battle_votes` result of each battle, keyed by battle id.
+        """
+        battles = [
+            self.battles[match.id] for match in self.matches[round.id]
+            if match.winner_id is None and match.id in self.battles
+        ]
+        return await self.count_votes(battles)
+
+    async def count_battle_votes(self, battle: Battle) -> dict:
+        result = await self.count_votes([battle])
+        return result[battle.id]
+
+    async def count_votes(self, battles: List[Battle]) -> Dict[uuid.UUID, dict]:
+        if not battles:
+            return {}
+
+        pipeline = [
+            {"$match": {
+                "battle_id": {"$in": [Binary.from_uuid(battle.id) for battle in battles]},
+            }},
+            {"$group": {
+                "_id": {"battle_id": "$battle_id", "waifu_vote_id": "$waifu_vote_id"},
+                "count": {"$sum": 1}
+            }}
+        ]
+        result = await Vote.get_motor_collection().aggregate(pipeline).to_list(None)
+
+        tally: Dict[Tuple[uuid.UUID, uuid.UUID], int] = {}
+        for group in result:
+            battle_id, waifu_vote_id = [
+                value if isinstance(value, uuid.UUID) else uuid.UUID(bytes=value)
+                for value in (group["_id"]["battle_id"], group["_id"]["waifu_vote_id"])
+            ]
+            tally[(battle_id, waifu_vote_id)] = group["count"]
+
+        return {
+            battle.id: self.resolve_battle(
+                battle,
+                red_votes=tally.get((battle.id, battle.waifu_red_id), 0),
+                blue_votes=tally.get((battle.id, battle.waifu_blue_id), 0),
+            )
+            for battle in battles
+        }
 
+    def resolve_battle(self, battle: Battle, red_votes: int, blue_votes: int) -> dict:
         d = {
             "result": None,
             "winner": None,
@@ -594,4 +608,4 @@ class Bracket():
             d["winner"] = blue_dict
             d["loser"] = red_dict
         
-        return d
\ No newline at end of file
+        return d
@@ -0,0 +1,228 @@
+import io
+import os
+import uuid
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict
+
+from PIL import Image
+
+UPPER_LEFT_INX = 0
+LOWER_RIGHT_INX = 1
+X_COORD_INX = 0
+Y_COORD_INX = 1
+
+VS_BACKGROUND_PATH = "assets/vs.jpg"
+MISSING_IMAGE_PATH = "assets/waifu_404.png"
+
+PORTRAIT_QUALITY = 90
+VS_OUTPUT_QUALITIES = (85, 75, 65, 50) # tried in order until the image fits
+VS_OUTPUT_MAX_BYTES = 1024**2
+
+
+class ImagePool():
+    """ Process pool that runs PIL work off the event loop.
+
+        `pending` is the number of jobs submitted but not yet finished, which
+        includes the jobs still waiting for a free worker.
+
+        Workers are started lazily, once the bot already runs Motor and
+        aiohttp threads, so they are never forked from the bot process
+        itself, which could hand a child a lock held by one of those threads.
+    """
+    def __init__(self, max_workers: int | None = None) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(start_method)
+        )
+        self.pending = 0
+        self.completed = 0
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """ Run a picklable, module-level function in a worker process. """
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def scale_image(img: Image.Image, scale_percent: float) -> Image.Image:
+    """ Scales an image to `scale_percent`. """
+    dim = (int(img.width * scale_percent), int(img.height * scale_percent))
+    return img.resize(dim, resample=Image.Resampling.BICUBIC)
+
+
+def get_bounding_box_coords(img: Image.Image) -> list:
+    """ Returns the coordinates of two boxes.  """
+    return [
+        # (x0, y0), (x1, y1)
+        [(int(img.width*0.10), int(img.height*0.10)), (int(img.width*0.40), int(img.height*0.90))], # left side
+        # (x2, y2), (x3, y3)
+        [(int(img.width*0.60), int(img.height*0.10)), (int(img.width*0.90), int(img.height*0.90))]  # right side
+    ]
+
+
+def center_place(img: Image.Image, bb_coords: list) -> tuple:
+    """ Calculate upper-left coordinate to place an image in center of bounding box. """
+    bb_width = bb_coords[LOWER_RIGHT_INX][X_COORD_INX] - bb_coords[UPPER_LEFT_INX][X_COORD_INX]
+    bb_height = bb_coords[LOWER_RIGHT_INX][Y_COORD_INX] - bb_coords[UPPER_LEFT_INX][Y_COORD_INX]
+    center_x = bb_coords[UPPER_LEFT_INX][X_COORD_INX] + bb_width//2
+    center_y = bb_coords[UPPER_LEFT_INX][Y_COORD_INX] + bb_height//2
+
+    return (center_x - img.width//2, center_y - img.height//2)
+
+
+def save_atomically(data: bytes, output_path: str) -> str:
+    """ Write `data` to `output_path`, renaming it into place so readers never see a partial file. """
+    temp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def normalize_character_image(image_path: str, output_path: str) -> str:
+    """ Save an RGBA WEBP copy of a character image scaled down for the versus bounding box.
+
+        Only an image whose long side is over the bounding box's is shrunk,
+        and only until that side matches it, which is the first scaling the
+        compositor applies to it anyway. The compositor then takes the same
+        path and gives the same layout and resolution as it would from the
+        original, with much less decoding and resizing. This only touches
+        the filesystem, so it is safe to run in an `ImagePool` worker.
+
+        Parameters
+        ----------
+        image_path: `str`
+            The downloaded image of the character.
+        output_path: `str`
+            Where to save the normalized copy.
+
+        Returns
+        -------
+        `str`
+            The path of the saved image.
+    """
+    with Image.open(VS_BACKGROUND_PATH) as bg_img: # only the header is read
+        bb = get_bounding_box_coords(bg_img)[0]
+    img = Image.open(image_path)
+    if (img.mode != "RGBA"):
+        img = img.convert("RGBA")
+
+    # scale the longer side down to the bb, matching the compositor's own first step
+    long_inx = 1 if img.height > img.width else 0 # 1=height, 0=width in .size
+    bb_long = bb[LOWER_RIGHT_INX][long_inx] - bb[UPPER_LEFT_INX][long_inx]
+    if img.size[long_inx] > bb_long:
+        size = [int(side * bb_long / img.size[long_inx]) for side in img.size]
+        size[long_inx] = bb_long # exact, so rounding can't send the compositor down the shrink-the-background path
+        img = img.resize(tuple(size), resample=Image.Resampling.BICUBIC)
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="WEBP", quality=PORTRAIT_QUALITY)
+    return save_atomically(buffer.getvalue(), output_path)
+
+
+def composite_versus_image(red_image_path: str | None, blue_image_path: str | None, output_path: str) -> str:
+    """ Composite two characters onto the versus background and save it as a JPEG.
+
+        Red is on the left and blue is on the right. The JPEG quality is
+        lowered step by step until it fits in `VS_OUTPUT_MAX_BYTES`. This
+        only touches the filesystem, so it is safe to run in an `ImagePool`
+        worker.
+
+        Parameters
+        ----------
+        red_image_path: `str`
+            The normalized image of the red character, or `None` if it is missing.
+        blue_image_path: `str`
+            The normalized image of the blue character, or `None` if it is missing.
+        output_path: `str`
+            Where to save the versus image.
+
+        Returns
+        -------
+        `str`
+            The path of the saved image.
+    """
+    # load background
+    bg_img = Image.open(VS_BACKGROUND_PATH)
+    if (bg_img.mode != "RGBA"):
+        bg_img = bg_img.convert("RGBA")
+
+    # get initial bounding box coords [upper-left, lower-right]
+    bb = get_bounding_box_coords(bg_img)
+
+    # load 2 foreground images
+    waifus: Dict[str, Dict[str, Image.Image | int]] = {}
+    for waifu_color, image_path in [("red", red_image_path), ("blue", blue_image_path)]:
+        # load fg image
+        load_img = Image.open(image_path or MISSING_IMAGE_PATH)
+        if (load_img.mode != "RGBA"):
+            load_img = load_img.convert("RGBA")
+
+        # determine longer side of each fg image
+        waifus[waifu_color] = {
+            "image": load_img,
+            "long_inx": 1 if load_img.height > load_img.width else 0, # 1=height, 0=width in .size
+        }
+
+    # determine the smaller image of the two using total pixels
+    if (waifus["red"]["image"].width * waifus["red"]["image"].height) < (waifus["blue"]["image"].width * waifus["blue"]["image"].height):
+        small_img_key = "red"
+        large_img_key = "blue"
+    else:
+        small_img_key = "blue"
+        large_img_key = "red"
+
+    # get length of bb side-of-interest
+    bb_long = bb[0][LOWER_RIGHT_INX][waifus[small_img_key]["long_inx"]] - bb[0][UPPER_LEFT_INX][waifus[small_img_key]["long_inx"]]
+    if waifus[small_img_key]["image"].size[waifus[small_img_key]["long_inx"]] < bb_long: # if the smaller fg is smaller than the bb
+        # scale the bg image
+        scale_percent = waifus[small_img_key]["image"].size[waifus[small_img_key]["long_inx"]] / bb_long
+        bg_img = scale_image(bg_img, scale_percent)
+
+        # scale the bb to the new bg size
+        bb = get_bounding_box_coords(bg_img)
+
+        # scale the larger fg to the new bb size
+        bb_long = bb[0][LOWER_RIGHT_INX][waifus[large_img_key]["long_inx"]] - bb[0][UPPER_LEFT_INX][waifus[large_img_key]["long_inx"]]
+        scale_percent = bb_long / waifus[large_img_key]["image"].size[waifus[large_img_key]["long_inx"]]
+        waifus[large_img_key]["image"] = scale_image(waifus[large_img_key]["image"], scale_percent)
+    else: # if the bb is smaller than the smaller fg
+        # scale both fg images to the bb
+        for key, waifu_value in waifus.items():
+            fg_img = waifu_value["image"]
+            long_inx = waifu_value["long_inx"]
+            bb_long = bb[0][LOWER_RIGHT_INX][long_inx] - bb[0][UPPER_LEFT_INX][long_inx]
+            scale_percent = bb_long / fg_img.size[long_inx]
+            if scale_percent != 1: # normalized images usually fit already
+                waifus[key]["image"] = scale_image(fg_img, scale_percent)
+
+    # final scaling and overlaying
+    for bb_inx, (_, waifu_value) in enumerate(waifus.items()):
+        fg_img = waifu_value["image"]
+        # in case a fg image's width is too wide for the bb, scale once more
+        bb_width = bb[bb_inx][LOWER_RIGHT_INX][X_COORD_INX] - bb[bb_inx][UPPER_LEFT_INX][X_COORD_INX]
+        if fg_img.width > bb_width:
+            scale_percent = bb_width / fg_img.width
+            fg_img = scale_image(fg_img, scale_percent)
+
+        # overlay fg images onto bg
+        bg_img.paste(fg_img, box=center_place(fg_img, bb[bb_inx]), mask=fg_img)
+
+    # encode the image, stepping the quality down until it fits
+    bg_img = bg_img.convert("RGB")
+    for quality in VS_OUTPUT_QUALITIES:
+        buffer = io.BytesIO()
+        bg_img.save(buffer, format="JPEG", quality=quality, optimize=True)
+        if buffer.tell() <= VS_OUTPUT_MAX_BYTES:
+            break
+    return save_atomically(buffer.getvalue(), output_path)
@@ -145,7 +145,7 @@ class PlayerBaseItem():
             await mongo.update_claim(claim)
             waifu = await mongo.fetch_waifu(claim.slug)
 
-            await self.owner.remove_inventory_item(self.type, 1)
+            await mongo.remove_inventory_item(self.owner, self.type, 1)
             self.amount -= 1
 
             embed = disnake.Embed(
@@ -177,7 +177,7 @@ class PlayerChestItem(PlayerBaseItem):
         claims = []
         for waifu in result:
             claim = await self.owner.generate_claim(waifu)
-            await mongo.insert_claim(claim)
+            await mongo.insert_harem_claim(claim)
             claims.append(claim)
             
             embed = disnake.Embed(
@@ -203,7 +203,7 @@ class PlayerChestItem(PlayerBaseItem):
             claim.timestamp=message.created_at
             await mongo.update_claim(claim)
         
-        await self.owner.remove_inventory_item(self.type, 1)
+        await mongo.remove_inventory_item(self.owner, self.type, 1)
         self.amount -= 1
 
 
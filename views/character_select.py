@@ -1,4 +1,5 @@
 import uuid
+from typing import Dict
 
 import disnake
 
@@ -16,6 +17,7 @@ class CharacterDropdown(disnake.ui.StringSelect["CharacterSelectView"]):
         ]
         super().__init__(placeholder="Select one of your characters", options=options)
         self.harem = harem
+        self.waifus: Dict[str, models.Waifu] | None = None
 
     async def callback(self, inter: disnake.MessageInteraction):
         choice = self.values[0]
@@ -26,9 +28,10 @@ class CharacterDropdown(disnake.ui.StringSelect["CharacterSelectView"]):
                 self.view.current_claim = claim
                 self.placeholder = f"Are you sure you want to select {claim.name} [{claim.skill_str_short}]?"
                 
-                waifu = await mongo.fetch_waifu(claim.slug)
+                if self.waifus is None:
+                    self.waifus = await mongo.fetch_waifus_by_slugs([claim.slug for claim in self.harem])
                 await inter.response.edit_message(
-                    embeds=[inter.message.embeds[0], WaifuHaremEmbed(waifu, claim)],
+                    embeds=[inter.message.embeds[0], WaifuHaremEmbed(self.waifus[claim.slug], claim)],
                     view=self.view
                 )
                 
@@ -24,7 +24,7 @@ class WaifuClaimView(disnake.ui.View):
     @disnake.ui.button(label="Sell", emoji=Emojis.COINS)
     async def sell(self, button: disnake.ui.Button, inter: disnake.MessageInteraction) -> None:
         nyah_player = await mongo.fetch_nyah_player(inter.author)
-        await nyah_player.sell_waifu(self.claim)
+        await mongo.sell_claim(nyah_player, self.claim)
         
         waifu = await mongo.fetch_waifu(self.claim.slug)
         sold_embed = disnake.Embed(
@@ -41,9 +41,9 @@ class WaifuClaimView(disnake.ui.View):
     @disnake.ui.button(label="Marry", emoji="💕")
     async def marry(self, button: disnake.ui.Button, inter: disnake.MessageInteraction) -> None:
         nyah_config = await mongo.fetch_nyah_config()
-        num_marriages = await mongo.fetch_harem_married_count(inter.author)
+        harem_summary = await mongo.fetch_harem_summary(inter.author)
 
-        if num_marriages >= nyah_config.waifu_max_marriages:
+        if harem_summary.married >= nyah_config.waifu_max_marriages:
             result_embed = disnake.Embed(
                 description=f"You are already at the maximum amount of marriages!",
                 color=disnake.Color.red()
@@ -57,9 +57,6 @@ class WaifuClaimView(disnake.ui.View):
             self.claim.marry()
             await mongo.update_claim(self.claim)
 
-            harem = await mongo.fetch_harem(inter.author)
-            await harem.reindex()
-
             waifu = await mongo.fetch_waifu(self.claim.slug)
             result_embed = disnake.Embed(
                 description=f"Married **__{waifu.name}__** 💕",
@@ -28,22 +28,39 @@ class WaifuDexView(disnake.ui.View):
             self.first_page.disabled = False
 
         # Sets the footer of the embeds with their respective page numbers.
-        for i, embed in enumerate(self.embeds):
-            embed.set_footer(text=f"Claimed 0 times  •  Character {i + 1} of {len(self.embeds)}")
+        for i in range(len(self.embeds)):
+            self.set_claim_footer(i, 0)
     
     @classmethod
     async def create_instance(cls, embeds: List[disnake.Embed], author: disnake.User | disnake.Member):
         instance = cls(embeds, author)
-        if await instance.author_claimed_before(embeds[0]):
+        instance.current_claims = await instance.author_claimed_before(embeds[0])
+        instance.set_claim_footer(0, len(instance.current_claims))
+        if instance.current_claims:
             instance.change_image.disabled = False
         else:
             instance.change_image.disabled = True
         return instance
     
     async def initialize_footers(self) -> None:
-        for i, embed in enumerate(self.embeds):
-            num_claims = len(await self.author_claimed_before(embed))
-            embed.set_footer(text=f"Claimed {num_claims} times • Character {i + 1} of {len(self.embeds)}")
+        """ Fill in the claim counts for every page with a single aggregation.
+
+            The first page is already counted by `create_instance`, so this can
+            run after the message has been sent.
+        """
+        claim_counts = await mongo.fetch_claim_counts_by_slug(
+            self.author,
+            [self.embed_slug(embed) for embed in self.embeds[1:]]
+        )
+        for i, embed in enumerate(self.embeds[1:], 1):
+            self.set_claim_footer(i, claim_counts.get(self.embed_slug(embed), 0))
+
+    def set_claim_footer(self, index: int, num_claims: int) -> None:
+        self.embeds[index].set_footer(text=f"Claimed {num_claims} times  •  Character {index + 1} of {len(self.embeds)}")
+
+    @staticmethod
+    def embed_slug(embed: disnake.Embed) -> str:
+        return embed.url.split("/")[-1].strip()
 
     async def on_timeout(self) -> None:
         await self.message.edit(view=None)
@@ -52,8 +69,7 @@ class WaifuDexView(disnake.ui.View):
         return interaction.author.id == self.author.id
     
     async def author_claimed_before(self, embed: disnake.Embed) -> List[models.Claim]:
-        slug = embed.url.split("/")[-1].strip()
-        return await mongo.fetch_claims_by_slug(self.author, slug)
+        return await mongo.fetch_claims_by_slug(self.author, self.embed_slug(embed))
     
     @disnake.ui.button(emoji=Emojis.FIRST_PAGE, style=disnake.ButtonStyle.blurple)
     async def first_page(self, button: disnake.ui.Button, interaction: disnake.MessageInteraction) -> None:
@@ -178,8 +178,7 @@ class FusionStageTwoView(disnake.ui.View):
         # get a random character that is a tier higher
         total_characters = await mongo.fetch_waifu_count()
         rank_range = utils.rank_from_tier(total_characters, FUSION_TIER_MAP[self.fusion_type])
-        range_aggregation = {"$match": {"popularity_rank": {"$gte": rank_range.start, "$lte": rank_range.stop}}}
-        new_waifu = await mongo.fetch_random_waifu([range_aggregation])
+        new_waifu = await mongo.fetch_random_waifu(min_rank=rank_range.start, max_rank=rank_range.stop + 1)
         
         # crate a claim from that character
         nyah_player = await mongo.fetch_nyah_player(interaction.author)
@@ -189,17 +188,13 @@ class FusionStageTwoView(disnake.ui.View):
         new_claim.message_id=interaction.message.id
         new_claim.jump_url=interaction.message.jump_url
         new_claim.timestamp=interaction.created_at
-        await mongo.insert_claim(new_claim)
         
         # remove each fused claim from the user's harem
         for claim in self.selected_fusions:
-            claim.state = WaifuState.FUSED
-            claim.index = None
-            await claim.save()
+            await mongo.remove_from_harem(claim, WaifuState.FUSED)
         
-        # reindex the user's harem
-        harem = await mongo.fetch_harem(interaction.author)
-        await harem.reindex()
+        # the new claim goes at the end of what is left
+        await mongo.insert_harem_claim(new_claim)
         
         # edit message with the new claim
         embed = interaction.message.embeds[0]
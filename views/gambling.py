@@ -5,8 +5,11 @@ from typing import List
 import disnake
 
 import models
+from helpers import Mongo
 from utils.constants import Emojis
 
+mongo = Mongo()
+
 class Symbol:
     SEVEN  = "<:Slot_7:1172053243690487808>"
     BAR    = "<:Slot_Bar:1172053260736155648>"
@@ -189,7 +192,7 @@ class SlotsView(disnake.ui.View):
     async def spin(self, button: disnake.ui.Button, interaction: disnake.MessageInteraction):
         await interaction.response.defer()
         
-        await self.machine.player.add_user_money(-self.machine.bet)
+        await mongo.add_user_money(self.machine.player, -self.machine.bet)
 
         self.machine.spin()
 
@@ -204,7 +207,7 @@ class SlotsView(disnake.ui.View):
         payout = self.machine.calculate_payout(self.machine.bet)
         self.machine.last_payout = payout
         if payout > 0:
-            await self.machine.player.add_user_money(payout)
+            await mongo.add_user_money(self.machine.player, payout)
         
         if self.machine.player.money == 0:
             await interaction.edit_original_response(embed=self.machine.current_embed, view=None)
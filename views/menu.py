@@ -21,6 +21,7 @@ class WaifuMenuView(disnake.ui.View):
         self.embeds = embeds
         self.author = author
         self.harem = harem
+        self.harem_summary: models.HaremSummary | None = None
 
         self.embed_index = 0
         self.prev_page.disabled = True
@@ -55,9 +56,10 @@ class WaifuMenuView(disnake.ui.View):
             self.marry_or_divorce.disabled = False
         elif current_claim.state == WaifuState.INACTIVE:
             nyah_config = await mongo.fetch_nyah_config()
-            num_marriages = await mongo.fetch_harem_married_count(self.author)
+            if not self.harem_summary:
+                self.harem_summary = await mongo.fetch_harem_summary(self.author)
 
-            if num_marriages >= nyah_config.waifu_max_marriages:
+            if self.harem_summary.married >= nyah_config.waifu_max_marriages:
                 self.marry_or_divorce.disabled = True
             else:
                 self.marry_or_divorce.disabled = False
@@ -191,12 +193,9 @@ class WaifuMenuView(disnake.ui.View):
         nyah_player = await mongo.fetch_nyah_player(inter.author)
 
         # update the sold waifu in the db
-        await nyah_player.sell_waifu(current_claim)
-
-        # reindex the database harem
-        harem = await mongo.fetch_harem(inter.author)
-        await harem.reindex()
-        self.harem = harem
+        await mongo.sell_claim(nyah_player, current_claim)
+        self.harem_summary = None
+        self.harem.discard(current_claim)
         
         # create the sold embed
         sold_embed = disnake.Embed(
@@ -405,6 +404,7 @@ class MarryDivorceView(disnake.ui.View):
                     view=None
                 )
         
+        self.reference_view.harem_summary = None
         await interaction.response.edit_message(
             embeds=[self.embed, result_embed],
             view=self.reference_view
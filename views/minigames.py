@@ -61,12 +61,8 @@ class WaifuNameGuessView(disnake.ui.View):
 
         result = await mongo.fetch_random_waifus(
             number=num_buttons - 1,
-            aggregations=[
-                {"$match": {
-                    "name": {"$nin": [answer, None]},
-                    "popularity_rank": {"$lt": 600}
-                }}
-            ]
+            max_rank=600,
+            exclude={"name": answer}
         )
         
         choices = [waifu.name for waifu in result]
@@ -107,12 +103,9 @@ class WaifuBustGuessView(disnake.ui.View):
 
         result = await mongo.fetch_random_waifus(
             number=num_buttons - 1,
-            aggregations=[
-                {"$match": {
-                    "bust": {"$nin": [answer, None]},
-                    "popularity_rank": {"$lt": 600}
-                }}
-            ]
+            pool="has_bust",
+            max_rank=600,
+            exclude={"bust": answer}
         )
         choices = [waifu.bust for waifu in result]
         choices.append(answer)
@@ -152,12 +145,9 @@ class WaifuAgeGuessView(disnake.ui.View):
 
         result = await mongo.fetch_random_waifus(
             number=num_buttons - 1,
-            aggregations=[
-                {"$match": {
-                    "age": {"$nin": [answer, None]},
-                    "popularity_rank": {"$lt": 600}
-                }}
-            ]
+            pool="has_age",
+            max_rank=600,
+            exclude={"age": answer}
         )
         choices = [waifu.age for waifu in result]
         choices.append(answer)
@@ -25,7 +25,7 @@ class WaifuPurchaseView(disnake.ui.View):
     async def buy(self, button: disnake.ui.Button, inter: disnake.MessageInteraction) -> None:
         nyah_player = await mongo.fetch_nyah_player(inter.author)
         
-        if nyah_player.money < self.cost:
+        if not await mongo.spend_user_money(nyah_player, self.cost):
             price_diff = self.cost - nyah_player.money
             confirmation_embed = disnake.Embed(
                 description=f"{inter.author.mention}\nYou need `{price_diff:,}` {Emojis.COINS}",
@@ -37,8 +37,6 @@ class WaifuPurchaseView(disnake.ui.View):
                         f"{inter.author}[{inter.author.id}] | "
                         f"Failed to buy '{self.waifu.slug}'")
         else:
-            await nyah_player.add_user_money(-self.cost)
-
             # Generate claim
             claim = await nyah_player.generate_claim(self.waifu)
 
@@ -58,11 +56,7 @@ class WaifuPurchaseView(disnake.ui.View):
             claim.message_id=message.id
             claim.jump_url=message.jump_url
             claim.timestamp=message.created_at
-            await mongo.insert_claim(claim)
-
-            # Update harem in db
-            harem = await mongo.fetch_harem(inter.author)
-            await harem.reindex()
+            await mongo.insert_harem_claim(claim)
         
             confirmation_embed = disnake.Embed(
                 description=f"{inter.author.mention}\n__**{self.waifu.name}**__ has been bought for `{self.cost:,}` {Emojis.COINS}.\n",